@@ -0,0 +1,374 @@
+"""
+Time alignment of two recordings of the same event (multi-recorder shoots,
+backup recorders) by FFT cross-correlation.
+
+    python alignment.py main.wav backup.flac --plot aligned.png
+
+Both files are streamed block by block, downmixed and decimated to about
+COARSE_RATE with a polyphase FIR, so hours of audio never sit in memory at
+full rate. A few of the loudest excerpts of the shorter file are searched for
+over the whole longer file with an overlap-save FFT correlation: the long
+signal is cut into overlapping chunks of a fixed FFT size and only the
+non-wrapped part of each chunk's correlation is kept. The best coarse lag is
+then refined on short excerpts around it, first at 8 kHz and finally at
+the full sample rate, with sub-sample (parabolic) interpolation of the peak.
+"""
+import os
+import sys
+import time
+import argparse
+from fractions import Fraction
+import numpy as np
+import soundfile as sf
+from scipy import fft as sp_fft
+from scipy.signal import firwin, resample_poly
+import audio_io
+import dsp
+
+COARSE_RATE = 1000            # Гц — частота грубого поиска по всей длине файлов
+COARSE_TAPS_PER_PHASE = 8     # длина антиалиасингового FIR = 8 * коэффициент децимации
+COARSE_EXCERPTS = 4           # сколько самых громких отрывков короткого файла ищем
+COARSE_EXCERPT_SEC = 30.0
+COARSE_FFT_FACTOR = 4         # размер FFT в overlap-save ~ 4 длины отрывка
+PEAK_EXCLUSION_SEC = 0.1      # окрестность пика, не считающаяся вторым пиком
+CONFIDENT_CORRELATION = 0.1   # корреляция на полной частоте, ниже которой уверенность снижается
+REFINE_LEVELS = ((8000, 20.0), (None, 5.0))   # (частота или None — исходная, длина отрывка в сек)
+REFINE_SEARCH_SAMPLES = 8     # окно уточнения: ± столько отсчётов предыдущего уровня
+ENVELOPE_RATE = 20            # точек огибающей в секунду для вида сравнения
+BLOCK_ROWS = 8192             # выходных отсчётов грубого сигнала за один блок чтения
+# libsndfile медленно переводит PCM во float — читаем целыми и масштабируем сами
+INTEGER_READ = {"PCM_S8": ("int16", 2 ** 15), "PCM_U8": ("int16", 2 ** 15), "PCM_16": ("int16", 2 ** 15),
+                "PCM_24": ("int32", 2 ** 31), "PCM_32": ("int32", 2 ** 31)}
+
+
+class MonoReader:
+    """
+    Mono float32 access to an audio file: streamed blocks and random excerpts.
+    Native formats are read through soundfile without decoding the whole file;
+    mp3 / m4a are decoded once with audio_io.load_audio.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        if audio_io.get_file_format(file_path) in audio_io.NATIVE_FORMATS:
+            self._file = sf.SoundFile(file_path)
+            self._data = None
+            self.sample_rate = self._file.samplerate
+            self.frames = self._file.frames
+            self._dtype, scale = INTEGER_READ.get(self._file.subtype, ("float32", 1))
+            # Даунмикс и масштабирование — одно умножение блока (frames, channels) на вектор весов
+            self._weights = np.full(self._file.channels, 1.0 / (scale * self._file.channels), dtype=np.float32)
+        else:
+            data, self.sample_rate, _ = audio_io.load_audio(file_path)
+            self._file = None
+            self._data = data if data.ndim == 1 else data.mean(axis=1, dtype=np.float32)
+            self.frames = len(self._data)
+
+    @property
+    def duration(self):
+        return self.frames / self.sample_rate
+
+    def blocks(self, block_frames):
+        if self._data is not None:
+            for start in range(0, self.frames, block_frames):
+                yield self._data[start:start + block_frames]
+            return
+        self._file.seek(0)
+        for block in self._file.blocks(blocksize=block_frames, dtype=self._dtype, always_2d=True):
+            yield block.astype(np.float32, copy=False) @ self._weights
+
+    def read(self, start, frames):
+        """`frames` samples from `start` (may lie outside the file — zero-padded)."""
+        out = np.zeros(frames, dtype=np.float32)
+        lo, hi = max(start, 0), min(start + frames, self.frames)
+        if hi <= lo:
+            return out
+        if self._data is not None:
+            out[lo - start:hi - start] = self._data[lo:hi]
+        else:
+            self._file.seek(lo)
+            block = self._file.read(hi - lo, dtype=self._dtype, always_2d=True)
+            out[lo - start:lo - start + len(block)] = block.astype(np.float32, copy=False) @ self._weights
+        return out
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ----------------- Грубый поиск -----------------
+
+class CoarseSignal:
+    """
+    A file decimated to about COARSE_RATE in one streaming pass, plus its
+    min/max envelope at ENVELOPE_RATE. Sample m of `data` is centred at
+    m / rate + delay seconds of the source (the FIR delay is compensated when
+    lags are converted to seconds).
+    """
+
+    def __init__(self, reader):
+        sr = reader.sample_rate
+        q = max(1, int(round(sr / COARSE_RATE)))
+        taps = COARSE_TAPS_PER_PHASE
+        self.rate = sr / q
+        self.delay = (q - 1 - (taps * q - 1) / 2) / sr
+        # Полифазная форма: блок (rows, q) @ H (q, taps) даёт вклады всех фаз одним умножением
+        h = firwin(taps * q, 0.8 / q).astype(np.float32)
+        H = np.ascontiguousarray(h.reshape(taps, q)[:, ::-1].T)
+        group = max(1, int(round(self.rate / ENVELOPE_RATE)))
+        self.envelope_rate = self.rate / group
+
+        history = np.zeros((taps - 1, taps), dtype=np.float32)
+        parts, env_min, env_max = [], [], []
+        for block in reader.blocks(q * group * max(1, BLOCK_ROWS // group)):
+            edges = np.arange(0, len(block), q * group)
+            env_min.append(np.minimum.reduceat(block, edges))
+            env_max.append(np.maximum.reduceat(block, edges))
+            rows = -(-len(block) // q)
+            if rows * q != len(block):
+                block = np.concatenate([block, np.zeros(rows * q - len(block), dtype=np.float32)])
+            Z = np.concatenate([history, block.reshape(rows, q) @ H])
+            out = np.zeros(rows, dtype=np.float32)
+            for p in range(taps):
+                out += Z[taps - 1 - p:taps - 1 - p + rows, p]
+            history = Z[len(Z) - (taps - 1):]
+            parts.append(out)
+        self.data = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+        self.env_min = np.concatenate(env_min) if env_min else self.data
+        self.env_max = np.concatenate(env_max) if env_max else self.data
+
+    def resampled(self, rate):
+        """The coarse samples at `rate` (for files with different sample rates)."""
+        ratio = Fraction(rate / self.rate).limit_denominator(1000)
+        if ratio == 1:
+            return self.data
+        return resample_poly(self.data, ratio.numerator, ratio.denominator).astype(np.float32)
+
+
+def _whiten(x):
+    """First difference: suppresses rumble / DC that differ between microphones."""
+    return np.diff(x, prepend=x[:1]) if len(x) else x
+
+
+def _pick_excerpts(x, length, count):
+    """Start indices of the `count` loudest non-overlapping windows of `length` samples."""
+    n_windows = max(1, len(x) // length)
+    energy = np.add.reduceat(x[:n_windows * length] ** 2, np.arange(0, n_windows * length, length))
+    order = np.argsort(energy)[::-1][:count]
+    return sorted(int(i) * length for i in order)
+
+
+def overlap_save_ncc(x, templates, length, total, lag_origin):
+    """
+    Adds the normalized cross-correlation of every template (start, samples) in
+    `templates` with the long signal `x` into `total`, indexed by the lag of the
+    template's file in x plus `lag_origin`. `x` is processed in overlap-save
+    chunks, so no FFT is longer than about COARSE_FFT_FACTOR * length.
+    """
+    n_fft = sp_fft.next_fast_len(COARSE_FFT_FACTOR * length, real=True)
+    step = n_fft - length + 1
+    spectra = []
+    for start, t in templates:
+        t = t - t.mean()
+        norm = np.sqrt(np.sum(t.astype(np.float64) ** 2)) or 1.0
+        spectra.append((start, np.conj(sp_fft.rfft(t / norm, n_fft))))
+    # Сигнал дополнен нулями с обеих сторон — отрывок может частично выходить за край
+    padded = np.concatenate([np.zeros(length, np.float32), x, np.zeros(length, np.float32)])
+    floor = 1e-3 * length * float(np.mean(x.astype(np.float64) ** 2) or 1.0)
+    for chunk_start in range(0, len(padded) - length + 1, step):
+        chunk = padded[chunk_start:chunk_start + n_fft]
+        spectrum = sp_fft.rfft(chunk, n_fft)
+        energy = np.concatenate([[0.0], np.cumsum(chunk.astype(np.float64) ** 2)])
+        n_out = min(step, len(chunk) - length + 1)
+        local = np.sqrt(np.maximum(energy[length:length + n_out] - energy[:n_out], floor))
+        position = chunk_start - length   # позиция в x первого выходного отсчёта
+        for start, conj_t in spectra:
+            corr = sp_fft.irfft(spectrum * conj_t, n_fft)[:n_out]
+            first = position - start + lag_origin
+            total[first:first + n_out] += corr / local
+
+
+def _excerpt_match(x, template, position):
+    """|Normalized correlation| of `template` with x[position:], 0 if it does not fit inside x."""
+    if position < 0 or position + len(template) > len(x):
+        return 0.0
+    segment = x[position:position + len(template)]
+    denom = np.linalg.norm(segment) * np.linalg.norm(template)
+    return abs(float(np.dot(segment, template))) / denom if denom else 0.0
+
+
+def _second_peak(scores, best, exclusion):
+    lo, hi = max(best - exclusion, 0), min(best + exclusion + 1, len(scores))
+    return max(scores[:lo].max(initial=0.0), scores[hi:].max(initial=0.0))
+
+
+# ----------------- Уточнение -----------------
+
+def _parabolic(y, i):
+    """Sub-sample position of the peak of |y| at index i."""
+    if i <= 0 or i >= len(y) - 1:
+        return float(i)
+    a, b, c = abs(y[i - 1]), abs(y[i]), abs(y[i + 1])
+    denom = a - 2 * b + c
+    return i + (0.5 * (a - c) / denom if denom else 0.0)
+
+
+def _read_at_rate(reader, start_sec, seconds, rate):
+    """
+    Excerpt of `reader` around `start_sec` as whitened samples at `rate` Hz.
+    Returns (samples, shift): the first sample lies at start_sec + shift.
+    """
+    sr = reader.sample_rate
+    margin = 0.05   # сек запаса на краевые эффекты фильтра ресемплинга
+    first = int(np.floor((start_sec - margin) * sr))
+    x = dsp.resample_to(reader.read(first, int(np.ceil((seconds + 2 * margin) * sr))), sr, rate)
+    trim = int(round(margin * rate))
+    x = x[trim:trim + int(round(seconds * rate))]
+    return _whiten(x), first / sr + trim / rate - start_sec
+
+
+def refine(long_reader, short_reader, offset, excerpt_center, rate, excerpt_sec, window_sec):
+    """
+    Re-estimates `offset` (seconds from the start of the long file to the start
+    of the short one) within ±window_sec by correlating an excerpt of the short
+    file around `excerpt_center` (seconds in the short file) at `rate` Hz.
+    Returns (offset, normalized correlation at the peak).
+    """
+    excerpt_sec = min(excerpt_sec, short_reader.duration)
+    t0 = min(max(excerpt_center - excerpt_sec / 2, 0.0), max(short_reader.duration - excerpt_sec, 0.0))
+    template, shift_t = _read_at_rate(short_reader, t0, excerpt_sec, rate)
+    search, shift_s = _read_at_rate(long_reader, t0 + offset - window_sec, excerpt_sec + 2 * window_sec, rate)
+    template = template - template.mean()
+    norm = np.sqrt(np.sum(template.astype(np.float64) ** 2)) or 1.0
+    n = len(template)
+    n_lags = len(search) - n + 1
+    n_fft = sp_fft.next_fast_len(len(search), real=True)
+    corr = sp_fft.irfft(sp_fft.rfft(search, n_fft) * np.conj(sp_fft.rfft(template, n_fft)), n_fft)[:n_lags]
+    energy = np.concatenate([[0.0], np.cumsum(search.astype(np.float64) ** 2)])
+    local = np.sqrt(np.maximum(energy[n:n + n_lags] - energy[:n_lags], 1e-12))
+    ncc = corr / (local * norm)
+    best = int(np.argmax(np.abs(ncc)))
+    lag = _parabolic(ncc, best)
+    # Отсчёт k поиска — время t0 + offset - window_sec + shift_s + k / rate в длинном файле
+    new_offset = (t0 + offset - window_sec + shift_s + lag / rate) - (t0 + shift_t)
+    return new_offset, float(ncc[best])
+
+
+# ----------------- Выравнивание -----------------
+
+def align(reference_path, other_path, with_envelopes=False):
+    """
+    Finds where `other_path` starts on the time line of `reference_path`.
+    Returns a dict with offset_sec (positive: the other recording started later),
+    offset_samples (at the reference sample rate), correlation (normalized
+    correlation at the full-rate peak; negative means inverted polarity),
+    confidence (0..1: how far the coarse peak stands above the next best lag,
+    scaled down when the correlation is below CONFIDENT_CORRELATION),
+    the per-level estimates and the elapsed seconds. With `with_envelopes` the
+    min/max envelopes of both files are included for plot_alignment.
+    """
+    started = time.perf_counter()
+    with MonoReader(reference_path) as reference, MonoReader(other_path) as other:
+        coarse_ref = CoarseSignal(reference)
+        coarse_other = CoarseSignal(other)
+
+        # Ищем отрывки более короткого файла по всей длине более длинного
+        swapped = other.duration > reference.duration
+        long_reader, short_reader = (other, reference) if swapped else (reference, other)
+        long_c, short_c = (coarse_other, coarse_ref) if swapped else (coarse_ref, coarse_other)
+        rate = long_c.rate
+        x = _whiten(long_c.data)
+        y = _whiten(short_c.resampled(rate))
+        if not len(y):
+            raise ValueError("the file is too short to align")
+
+        length = max(1, min(int(COARSE_EXCERPT_SEC * rate), len(y)))
+        starts = _pick_excerpts(y, length, COARSE_EXCERPTS)
+        total = np.zeros(len(x) + len(y) + 1, dtype=np.float32)
+        overlap_save_ncc(x, [(s, y[s:s + length]) for s in starts], length, total, len(y))
+        scores = np.abs(total)
+        best = int(np.argmax(scores))
+        second = _second_peak(scores, best, int(PEAK_EXCLUSION_SEC * rate))
+        margin = float(np.clip(1.0 - second / scores[best], 0.0, 1.0)) if scores[best] > 0 else 0.0
+        offset = (_parabolic(total, best) - len(y)) / rate + long_c.delay - short_c.delay
+        levels = [(rate, offset)]
+
+        # Для уточнения берём отрывок, сильнее всех совпавший на найденном сдвиге
+        votes = [_excerpt_match(x, y[s:s + length], best - len(y) + s) for s in starts]
+        center = (starts[int(np.argmax(votes))] + length / 2) / rate
+
+        correlation = float(total[best]) / len(starts)
+        previous_rate = rate
+        for level_rate, excerpt_sec in REFINE_LEVELS:
+            if level_rate is None:
+                level_rate = long_reader.sample_rate
+            elif level_rate >= long_reader.sample_rate:
+                continue
+            window = REFINE_SEARCH_SAMPLES / previous_rate
+            offset, correlation = refine(long_reader, short_reader, offset, center, level_rate,
+                                         excerpt_sec, window)
+            levels.append((level_rate, offset))
+            previous_rate = level_rate
+
+    # Уникальный грубый пик при слабой корреляции — скорее совпадение, чем выравнивание
+    confidence = margin * min(1.0, abs(correlation) / CONFIDENT_CORRELATION)
+    sign = -1 if swapped else 1
+    result = {
+        "reference": reference_path,
+        "other": other_path,
+        "offset_sec": sign * offset,
+        "offset_samples": int(round(sign * offset * reference.sample_rate)),
+        "sample_rate": reference.sample_rate,
+        "correlation": correlation,
+        "confidence": confidence,
+        "levels": [(r, sign * o) for r, o in levels],
+        "seconds": time.perf_counter() - started,
+    }
+    if with_envelopes:
+        result["envelopes"] = [(c.envelope_rate, c.env_min, c.env_max) for c in (coarse_ref, coarse_other)]
+    return result
+
+
+def format_result(result):
+    lines = [
+        f"Offset: {result['offset_sec']:+.6f} sec ({result['offset_samples']:+d} samples "
+        f"at {result['sample_rate']} Hz)",
+        f"Correlation: {abs(result['correlation']):.3f}"
+        + (" (inverted polarity)" if result["correlation"] < 0 else ""),
+        f"Confidence: {result['confidence']:.2f}",
+        "Levels: " + ", ".join(f"{rate:g} Hz → {offset:+.6f}" for rate, offset in result["levels"]),
+        f"Time: {result['seconds']:.2f} sec",
+    ]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find the time offset between two recordings of the same event.")
+    parser.add_argument("reference")
+    parser.add_argument("other")
+    parser.add_argument("--plot", default=None, help="save the aligned comparison view (png / svg)")
+    args = parser.parse_args(argv)
+
+    result = align(args.reference, args.other, with_envelopes=bool(args.plot))
+    print(format_result(result))
+    if args.plot:
+        import matplotlib
+        matplotlib.use("Agg")
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        import plots
+        figure = Figure(figsize=(10, 5), dpi=100)
+        FigureCanvasAgg(figure)
+        plots.plot_alignment(figure, result, [os.path.basename(args.reference), os.path.basename(args.other)])
+        figure.savefig(args.plot)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,432 @@
+"""
+Local HTTP analysis service. Other tools can get the analyzer's statistics,
+spectra and envelopes as JSON without the GUI.
+
+Front end: asyncio HTTP server. Back end: worker processes that decode and
+analyze files; a worker whose job times out or crashes is killed and replaced.
+Requests wait in a bounded queue; when it is full the service answers 503
+right away, before reading the request body (backpressure), and each request
+has a timeout.
+
+    python analysis_service.py --port 8765 --workers 4
+
+    POST /analyze          {"path": "/music/a.wav", "spectrum_points": 512, "envelope_points": 1000}
+    POST /analyze?name=a.mp3   raw file bytes in the body (upload)
+    GET  /metrics          queue / concurrency / latency counters
+    GET  /health
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import collections
+import multiprocessing
+import concurrent.futures
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+import audio_io
+import pipeline
+
+DEFAULT_SPECTRUM_POINTS = 512
+DEFAULT_ENVELOPE_POINTS = 1000
+MAX_POINTS = 20000
+
+STATUS_TEXT = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+class RequestError(Exception):
+    """Error that is reported to the client with the given HTTP status."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def analyze_file(file_path, spectrum_points=DEFAULT_SPECTRUM_POINTS, envelope_points=DEFAULT_ENVELOPE_POINTS,
+                 display_name=None):
+    """
+    Worker entry point: decodes the file and returns a JSON-serializable dict
+    with the file info, per-channel statistics, a downsampled spectrum, a
+    peak envelope and the per-stage pipeline timings.
+    """
+    ext = audio_io.get_file_format(display_name or file_path)
+    graph = pipeline.AnalysisGraph.from_file(file_path)
+    data, sample_rate, channels = graph.data, graph.sample_rate, graph.n_channels
+    stats = graph.get("statistics")
+    freqs, spectrum_db = graph.get("average_spectrum", points=spectrum_points)
+    times, env_min, env_max = graph.get("envelope", points=envelope_points)
+    activity = graph.get("activity")
+    return {
+        "file": os.path.basename(display_name or file_path),
+        "format": ext.upper(),
+        "sample_rate": int(sample_rate),
+        "channels": int(channels),
+        "bit_depth": audio_io.get_bit_depth(file_path, ext),
+        "duration": len(data) / sample_rate,
+        "statistics": [
+            {key: float(stats[key][i]) for key in ("min", "max", "mean", "rms")}
+            for i in range(channels)
+        ],
+        "spectrum": {
+            "frequencies": freqs.tolist(),
+            "magnitude_db": spectrum_db.T.tolist(),
+        },
+        "envelope": {
+            "times": times.tolist(),
+            "min": env_min.T.tolist(),
+            "max": env_max.T.tolist(),
+        },
+        "activity": {
+            "active_ratio": activity.active_ratio,
+            "events": (activity.events / sample_rate).tolist(),
+        },
+        "timings": [
+            {"stage": row["stage"], "params": row["params"], "seconds": row["seconds"]}
+            for row in graph.timings()
+        ],
+    }
+
+
+def _worker_main(conn):
+    """Analysis process: runs analyze_file for every job received over `conn`."""
+    while True:
+        try:
+            args = conn.recv()
+        except EOFError:
+            return
+        try:
+            reply = ("ok", analyze_file(*args))
+        except Exception as e:
+            reply = ("error", str(e))
+        conn.send(reply)
+
+
+class AnalysisWorker:
+    """
+    One analysis process fed over a pipe. Unlike a pool worker it can be killed
+    on its own (the way decoder_worker.DecodeJob.cancel does) when its job times
+    out, and a crash only loses the job it was running.
+    """
+
+    # spawn, а не fork: форкнутый worker унаследовал бы слушающий и клиентские сокеты сервера
+    CONTEXT = multiprocessing.get_context("spawn")
+
+    def __init__(self):
+        self.conn, child_conn = self.CONTEXT.Pipe()
+        self.process = self.CONTEXT.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+
+    def run(self, args):
+        """Blocking: sends one job and returns ("ok", result) or ("error", message); EOFError if the process died."""
+        self.conn.send(args)
+        return self.conn.recv()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+
+
+class Metrics:
+    """Counters and latency statistics reported by GET /metrics."""
+
+    def __init__(self, history=1000):
+        self.started = time.time()
+        self.requests = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.running = 0
+        self.max_running = 0
+        self.latencies = collections.deque(maxlen=history)
+
+    def snapshot(self, queued, queue_size, workers):
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        return {
+            "uptime_sec": time.time() - self.started,
+            "workers": workers,
+            "queue_size": queue_size,
+            "queued": queued,
+            "running": self.running,
+            "max_running": self.max_running,
+            "requests": self.requests,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "latency_ms": {
+                "mean": float(latencies.mean() * 1000),
+                "p50": float(np.percentile(latencies, 50) * 1000),
+                "p95": float(np.percentile(latencies, 95) * 1000),
+                "max": float(latencies.max() * 1000),
+            },
+        }
+
+
+class AnalysisService:
+    """
+    asyncio HTTP front end + worker process back end.
+
+    `workers` dispatcher tasks, each owning one AnalysisWorker, take jobs from a
+    FIFO queue of `queue_size` entries, so a long file occupies a single worker
+    while the rest keep serving the queue. A job whose client got 504 is not
+    left running: its worker is killed and started again for the next job.
+    """
+
+    def __init__(self, host="127.0.0.1", port=8765, workers=None, queue_size=32, timeout=60.0,
+                 max_upload_mb=512):
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.max_upload = int(max_upload_mb * 1024 * 1024)
+        self.metrics = Metrics()
+        self.queue = None
+        self.waiters = None
+        self.server = None
+        self.dispatchers = []
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        # Потоки, ждущие ответа worker'ов по pipe (по одному на диспетчер)
+        self.waiters = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers)
+        self.dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # Если порт был 0, узнаём реально выделенный
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        for task in self.dispatchers:
+            task.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        if self.waiters is not None:
+            self.waiters.shutdown(wait=False, cancel_futures=True)
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Sound Analyzer service on http://{self.host}:{self.port} ({self.workers} workers)")
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    # ----------------- Очередь и процессы -----------------
+    async def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        worker = None
+        try:
+            while True:
+                args, future = await self.queue.get()
+                try:
+                    if future.done():
+                        # Клиент уже получил таймаут, пока задача ждала в очереди
+                        continue
+                    self.metrics.running += 1
+                    self.metrics.max_running = max(self.metrics.max_running, self.metrics.running)
+                    try:
+                        worker = worker or AnalysisWorker()
+                        reply = loop.run_in_executor(self.waiters, worker.run, args)
+                        await asyncio.wait({reply, future}, return_when=asyncio.FIRST_COMPLETED)
+                        if not reply.done():
+                            # Клиент получил 504 — убиваем процесс, а не оставляем задачу занимать его
+                            await self._retire(worker, reply)
+                            worker = None
+                            continue
+                        try:
+                            status, value = reply.result()
+                        except (EOFError, OSError):
+                            # Процесс упал (например, нативный декодер на битом файле) — отказываем
+                            # только этой задаче, следующая получит новый процесс
+                            await self._retire(worker, reply)
+                            worker = None
+                            status, value = "error", "analysis worker crashed on this file"
+                        if not future.done():
+                            if status == "ok":
+                                future.set_result(value)
+                            else:
+                                future.set_exception(RuntimeError(value))
+                    finally:
+                        self.metrics.running -= 1
+                finally:
+                    self.queue.task_done()
+        finally:
+            if worker is not None:
+                worker.kill()
+
+    @staticmethod
+    async def _retire(worker, reply):
+        worker.kill()
+        await asyncio.gather(reply, return_exceptions=True)
+        worker.conn.close()
+
+    async def submit(self, *args):
+        """Queues an analysis and waits for it; raises RequestError on backpressure / timeout."""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((args, future))
+        except asyncio.QueueFull:
+            raise self._queue_full()
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.metrics.timed_out += 1
+            raise RequestError(504, f"analysis did not finish in {self.timeout:g} sec")
+
+    def _queue_full(self):
+        self.metrics.rejected += 1
+        return RequestError(503, "analysis queue is full, retry later")
+
+    # ----------------- HTTP -----------------
+    async def _handle_connection(self, reader, writer):
+        start = time.perf_counter()
+        headers = {}
+        try:
+            method, target, request_headers = await self._read_head(reader)
+            self.metrics.requests += 1
+            status, payload = await self._route(method, target, request_headers, reader)
+        except RequestError as e:
+            status, payload = e.status, {"error": str(e)}
+            if e.status == 503:
+                headers["Retry-After"] = "1"
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+            return
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+
+        if status == 200 and "statistics" in payload:
+            self.metrics.completed += 1
+            self.metrics.latencies.append(time.perf_counter() - start)
+        elif status not in (200, 503, 504):
+            self.metrics.failed += 1
+
+        body = json.dumps(payload).encode("utf-8")
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                "Content-Type: application/json",
+                f"Content-Length: {len(body)}",
+                "Connection: close"]
+        head += [f"{key}: {value}" for key, value in headers.items()]
+        try:
+            writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _read_head(self, reader):
+        request_line = (await reader.readline()).decode("latin-1").strip()
+        if not request_line:
+            raise asyncio.IncompleteReadError(b"", None)
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise RequestError(400, "malformed request line")
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1")
+            if line in ("\r\n", "\n", ""):
+                break
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+        return parts[0].upper(), parts[1], headers
+
+    async def _read_body(self, reader, headers):
+        length = int(headers.get("content-length", 0))
+        if length > self.max_upload:
+            raise RequestError(413, f"body larger than {self.max_upload} bytes")
+        return await reader.readexactly(length) if length else b""
+
+    async def _route(self, method, target, headers, reader):
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if url.path == "/health":
+            return 200, {"status": "ok"}
+        if url.path == "/metrics":
+            return 200, self.metrics.snapshot(self.queue.qsize(), self.queue_size, self.workers)
+        if url.path != "/analyze":
+            raise RequestError(404, f"unknown path {url.path}")
+        if method != "POST":
+            raise RequestError(405, "use POST /analyze")
+
+        # Очередь проверяем до чтения тела: иначе под нагрузкой в памяти копятся
+        # загрузки (до max_upload каждая), которые всё равно получат 503
+        if self.queue.full():
+            raise self._queue_full()
+        body = await self._read_body(reader, headers)
+        if headers.get("content-type", "").startswith("application/json"):
+            return 200, await self._analyze_path(body)
+        return 200, await self._analyze_upload(body, query)
+
+    async def _analyze_path(self, body):
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise RequestError(400, "invalid JSON body")
+        file_path = request.get("path")
+        if not file_path:
+            raise RequestError(400, "'path' is required")
+        if not os.path.isfile(file_path):
+            raise RequestError(404, f"file not found: {file_path}")
+        return await self.submit(file_path, *self._points(request))
+
+    async def _analyze_upload(self, body, query):
+        if not body:
+            raise RequestError(400, "empty upload")
+        name = os.path.basename(query.get("name", "upload.wav"))
+        if audio_io.get_file_format(name) not in audio_io.SUPPORTED_FORMATS:
+            raise RequestError(400, f"unsupported format: {name}")
+        suffix = "." + audio_io.get_file_format(name)
+        fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                await asyncio.to_thread(f.write, body)
+            return await self.submit(tmp_path, *self._points(query), name)
+        finally:
+            os.remove(tmp_path)
+
+    @staticmethod
+    def _points(params):
+        try:
+            spectrum_points = int(params.get("spectrum_points", DEFAULT_SPECTRUM_POINTS))
+            envelope_points = int(params.get("envelope_points", DEFAULT_ENVELOPE_POINTS))
+        except (TypeError, ValueError):
+            raise RequestError(400, "spectrum_points / envelope_points must be integers")
+        if not (1 <= spectrum_points <= MAX_POINTS and 1 <= envelope_points <= MAX_POINTS):
+            raise RequestError(400, f"points must be between 1 and {MAX_POINTS}")
+        return spectrum_points, envelope_points
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sound Analyzer local HTTP analysis service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=None, help="analysis processes (default: all cores)")
+    parser.add_argument("--queue-size", type=int, default=32, help="max waiting requests before 503")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--max-upload-mb", type=float, default=512)
+    args = parser.parse_args(argv)
+
+    service = AnalysisService(args.host, args.port, workers=args.workers, queue_size=args.queue_size,
+                              timeout=args.timeout, max_upload_mb=args.max_upload_mb)
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import os
+import wave
+import numpy as np
+import soundfile as sf
+from scipy.io import wavfile
+from pydub import AudioSegment
+
+# Расширения, которые читаем напрямую через scipy/soundfile (остальное — через pydub/ffmpeg)
+NATIVE_FORMATS = ["wav", "flac", "ogg", "aiff", "aif"]
+SUPPORTED_FORMATS = NATIVE_FORMATS + ["mp3", "m4a"]
+
+
+def get_file_format(file_path):
+    """Returns the lower-case file extension without the dot ("wav", "mp3", ...)."""
+    return os.path.splitext(file_path)[1].lower().replace('.', '')
+
+
+def collect_files(inputs):
+    """Expands files and directories (recursively) into a sorted list of audio files."""
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            for dir_path, _, names in os.walk(path):
+                for name in names:
+                    if get_file_format(name) in SUPPORTED_FORMATS:
+                        files.append(os.path.join(dir_path, name))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def get_bit_depth(file_path, ext):
+    try:
+        if ext == "wav":
+            with wave.open(file_path, 'rb') as wav_file:
+                return f"{wav_file.getsampwidth() * 8}-bit"
+        else:
+            info = sf.info(file_path)
+            if "PCM" in info.subtype:
+                return f"{info.subtype.replace('PCM_', '')}-bit"
+            else:
+                return "n/a"
+    except Exception:
+        return "n/a"
+
+
+def load_audio(file_path):
+    """
+    Decodes an audio file into a float32 array.
+    Returns (data, sample_rate, channels); mono data is 1-D, multichannel data
+    has shape (n_samples, channels).
+    """
+    ext = get_file_format(file_path)
+    if ext in NATIVE_FORMATS:
+        try:
+            sample_rate, data = wavfile.read(file_path)
+            data = data.astype(np.float32)
+            max_abs = np.max(np.abs(data))
+            if max_abs > 0:
+                data /= max_abs
+        except Exception:
+            data, sample_rate = sf.read(file_path, always_2d=True)
+        if data.ndim > 1:
+            channels = data.shape[1]
+            if channels == 1:
+                data = data[:, 0]
+        else:
+            channels = 1
+    else:
+        # Для mp3, m4a и т.д.
+        audio = AudioSegment.from_file(file_path)
+        sample_rate = audio.frame_rate
+        channels = audio.channels
+        data = np.array(audio.get_array_of_samples())
+        if channels > 1:
+            data = data.reshape((-1, channels))
+        max_val = float(2 ** (8 * audio.sample_width))
+        data = data.astype(np.float32) / max_val
+    return data, sample_rate, channels
@@ -0,0 +1,222 @@
+"""
+Out-of-process decoding. The decoder runs in its own process and writes float32
+samples into a multiprocessing.shared_memory block; the GUI maps that block as
+a NumPy array without copying. The worker reports the header, incremental
+progress with partial statistics, and completion through a pipe, so a slow or
+crashing decoder never blocks or takes down the Tk thread. The final statistics
+and the activity index are computed in the worker too and arrive with the
+"done" message, so the GUI does not pass over the whole signal again.
+"""
+import time
+import multiprocessing
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+import soundfile as sf
+import audio_io
+import dsp
+
+BLOCK_FRAMES = 1 << 18     # кадров за одно чтение из файла
+PROGRESS_INTERVAL = 0.2    # сек между сообщениями о прогрессе
+
+
+class PartialStats:
+    """Running min / max / mean / RMS per channel over the blocks decoded so far."""
+
+    def __init__(self, channels):
+        self.count = 0
+        self.min = np.full(channels, np.inf)
+        self.max = np.full(channels, -np.inf)
+        self.sum = np.zeros(channels)
+        self.sum_sq = np.zeros(channels)
+
+    def update(self, block):
+        self.count += len(block)
+        self.min = np.minimum(self.min, block.min(axis=0))
+        self.max = np.maximum(self.max, block.max(axis=0))
+        self.sum += block.sum(axis=0, dtype=np.float64)
+        self.sum_sq += np.einsum("ij,ij->j", block, block, dtype=np.float64)
+
+    def peak(self):
+        """Largest absolute sample value seen so far (0.0 before the first block)."""
+        if not self.count:
+            return 0.0
+        return float(max(np.max(np.abs(self.min)), np.max(np.abs(self.max))))
+
+    def as_dict(self, scale=1.0):
+        count = max(self.count, 1)
+        return {
+            "min": (self.min / scale).tolist(),
+            "max": (self.max / scale).tolist(),
+            "mean": (self.sum / count / scale).tolist(),
+            "rms": (np.sqrt(self.sum_sq / count) / scale).tolist(),
+        }
+
+
+def _create_block(frames, channels):
+    size = max(1, frames * channels * 4)
+    # Блоком владеет GUI (он же делает unlink), поэтому worker не должен
+    # регистрировать его в resource_tracker — иначе блок удалится при выходе worker'а
+    try:
+        shm = shared_memory.SharedMemory(create=True, size=size, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm, np.ndarray((frames, channels), dtype=np.float32, buffer=shm.buf)
+
+
+def _decode_streaming(f, file_path, ext, conn):
+    frames, channels, sample_rate = f.frames, f.channels, f.samplerate
+    bit_depth = audio_io.get_bit_depth(file_path, ext)
+    # Сразу после создания блок передаётся GUI: дальше он освобождает его
+    # и при ("error", ...), поэтому между созданием и заголовком ничего не должно падать
+    shm, out = _create_block(frames, channels)
+    conn.send(("header", {
+        "shm_name": shm.name, "frames": frames, "channels": channels,
+        "sample_rate": sample_rate, "bit_depth": bit_depth,
+    }))
+    stats = PartialStats(channels)
+    pos = 0
+    last_report = time.perf_counter()
+    while pos < frames:
+        block = f.read(min(BLOCK_FRAMES, frames - pos), dtype="float32", always_2d=True)
+        if not len(block):
+            break
+        out[pos:pos + len(block)] = block
+        stats.update(block)
+        pos += len(block)
+        if time.perf_counter() - last_report > PROGRESS_INTERVAL:
+            # WAV в итоге нормируется по пику — частичную статистику масштабируем
+            # по текущему пику, чтобы она была в тех же единицах, что и итоговая
+            peak = stats.peak() if ext == "wav" else 0.0
+            conn.send(("progress", pos, stats.as_dict(scale=peak or 1.0)))
+            last_report = time.perf_counter()
+    # Как и при чтении через scipy.io.wavfile — нормируем WAV по пику
+    peak = stats.peak() if ext == "wav" else 0.0
+    if peak > 0:
+        out[:pos] /= peak
+    _send_done(conn, out[:pos], sample_rate, stats.as_dict(scale=peak or 1.0))
+    del out
+    shm.close()
+
+
+def _decode_whole(file_path, ext, conn):
+    # mp3, m4a и т.д. декодируются pydub/ffmpeg целиком — прогресс только в конце
+    data, sample_rate, channels = audio_io.load_audio(file_path)
+    frames = len(data)
+    bit_depth = audio_io.get_bit_depth(file_path, ext)
+    shm, out = _create_block(frames, channels)
+    conn.send(("header", {
+        "shm_name": shm.name, "frames": frames, "channels": channels,
+        "sample_rate": sample_rate, "bit_depth": bit_depth,
+    }))
+    out[:] = data.reshape(frames, channels)
+    stats = PartialStats(channels)
+    for start in range(0, frames, BLOCK_FRAMES):
+        stats.update(out[start:start + BLOCK_FRAMES])
+    _send_done(conn, out, sample_rate, stats.as_dict())
+    del out
+    shm.close()
+
+
+def _send_done(conn, samples, sample_rate, stats):
+    # Итоговую статистику и индекс активности отдаём готовыми, чтобы GUI
+    # не пересчитывал их по всему сигналу на потоке Tk
+    conn.send(("done", len(samples), {
+        "statistics": {key: np.asarray(value) for key, value in stats.items()},
+        "activity": dsp.ActivityIndex(samples, sample_rate),
+    }))
+
+
+def _decode_main(file_path, conn):
+    """Worker process entry point."""
+    try:
+        ext = audio_io.get_file_format(file_path)
+        f = None
+        if ext in audio_io.NATIVE_FORMATS:
+            try:
+                f = sf.SoundFile(file_path)
+            except RuntimeError:
+                # libsndfile не знает этот вариант файла — пробуем общий путь.
+                # Только здесь, до заголовка: после него блок уже отдан GUI,
+                # и ошибки чтения сообщаются как ("error", ...)
+                pass
+        if f is None:
+            _decode_whole(file_path, ext, conn)
+        else:
+            with f:
+                _decode_streaming(f, file_path, ext, conn)
+    except Exception as e:
+        conn.send(("error", str(e)))
+    finally:
+        conn.close()
+
+
+class DecodeJob:
+    """
+    GUI-side handle of one decode. Call poll() periodically (e.g. from
+    root.after) to receive ("header", info), ("progress", frames, stats),
+    ("done", frames, results) and ("error", message) messages. `results` holds
+    the final "statistics" and "activity" (a dsp.ActivityIndex) of the signal.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.conn, child_conn = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(target=_decode_main, args=(file_path, child_conn), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.header = None
+        self.shm = None
+        self.finished = False
+
+    def poll(self):
+        """Returns the messages received since the last call (non-blocking)."""
+        if self.finished:
+            return []
+        # Проверяем «жив ли» до чтения: всё, что процесс успел отправить, уже в канале
+        alive = self.process.is_alive()
+        messages = []
+        while self.conn.poll():
+            try:
+                message = self.conn.recv()
+            except EOFError:
+                break
+            if message[0] == "header":
+                self.header = message[1]
+                self.shm = shared_memory.SharedMemory(name=self.header["shm_name"])
+            elif message[0] in ("done", "error"):
+                self.finished = True
+            messages.append(message)
+        if not alive and not self.finished:
+            self.finished = True
+            messages.append(("error", f"decoder process exited unexpectedly (code {self.process.exitcode})"))
+        return messages
+
+    def array(self, frames=None):
+        """Zero-copy NumPy view of the decoded samples: (frames,) for mono, (frames, channels) otherwise."""
+        frames = self.header["frames"] if frames is None else frames
+        channels = self.header["channels"]
+        shape = (frames,) if channels == 1 else (frames, channels)
+        return np.ndarray(shape, dtype=np.float32, buffer=self.shm.buf)
+
+    def cancel(self):
+        """Kills the decoder immediately and frees the shared block."""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.finished = True
+        self.release()
+
+    def release(self):
+        self.conn.close()
+        if self.shm is not None:
+            try:
+                self.shm.close()
+            except BufferError:
+                # Ещё есть массивы поверх буфера — отображение закроется вместе с ними
+                pass
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+            self.shm = None
@@ -0,0 +1,285 @@
+import functools
+from fractions import Fraction
+import numpy as np
+from scipy import sparse
+from scipy import fft as sp_fft
+from scipy.signal import resample_poly, welch
+
+# Запас над частотой Найквиста: фильтр resample_poly не идеально крутой,
+# поэтому новая частота дискретизации берётся чуть выше 2 * max_freq.
+RESAMPLE_MARGIN = 1.1
+
+
+def decimation_factor(sample_rate, max_freq):
+    """Integer decimation factor that still keeps `max_freq` below the new Nyquist frequency."""
+    if not max_freq or max_freq <= 0:
+        return 1
+    return max(1, int(sample_rate // (2 * RESAMPLE_MARGIN * max_freq)))
+
+
+def decimate(data, sample_rate, q):
+    """
+    Decimates `data` (along axis 0) by the integer factor `q` with an
+    anti-aliased polyphase filter. Returns (data, new_sample_rate).
+    """
+    if q == 1:
+        return data, sample_rate
+    resampled = resample_poly(data, 1, q, axis=0).astype(np.float32)
+    return resampled, sample_rate / q
+
+
+def resample_to(data, sample_rate, target_rate):
+    """Resamples `data` (along axis 0) to exactly `target_rate` with resample_poly."""
+    if sample_rate == target_rate:
+        return data
+    ratio = Fraction(int(target_rate), int(sample_rate))
+    return resample_poly(data, ratio.numerator, ratio.denominator, axis=0).astype(np.float32)
+
+
+# ----------------- Mel / Constant-Q спектрограммы -----------------
+# Фильтры строятся один раз на (sample_rate, n_fft, число полос) и хранятся как
+# разреженные матрицы; к кадрам STFT они применяются пакетно (sparse @ dense).
+
+STFT_BLOCK_FRAMES = 2048       # не больше кадров за один проход
+STFT_BLOCK_BYTES = 64 << 20    # и не больше байт спектра за проход: у CQT n_fft до 65536
+CQT_FMIN = 32.70          # C1
+CQT_BINS_PER_OCTAVE = 12
+CQT_MAX_FRAMES = 4000     # больше столбцов на экране всё равно не видно
+
+
+def hz_to_mel(f):
+    return 2595.0 * np.log10(1.0 + np.asarray(f) / 700.0)
+
+
+def mel_to_hz(m):
+    return 700.0 * (10.0 ** (np.asarray(m) / 2595.0) - 1.0)
+
+
+@functools.lru_cache(maxsize=16)
+def mel_filterbank(sample_rate, n_fft, n_mels, fmax=None):
+    """
+    Triangular mel filterbank as a sparse (n_mels, n_fft // 2 + 1) matrix.
+    Returns (filterbank, center_frequencies).
+    """
+    fmax = min(fmax or sample_rate / 2, sample_rate / 2)
+    bin_freqs = np.fft.rfftfreq(n_fft, d=1 / sample_rate)
+    edges = mel_to_hz(np.linspace(hz_to_mel(0.0), hz_to_mel(fmax), n_mels + 2))
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    rising = (bin_freqs - lower) / np.maximum(center - lower, 1e-10)
+    falling = (upper - bin_freqs) / np.maximum(upper - center, 1e-10)
+    weights = np.maximum(0.0, np.minimum(rising, falling))
+    # Нормируем по площади, чтобы широкие верхние полосы не «перевешивали»
+    weights *= (2.0 / np.maximum(upper - lower, 1e-10))
+    return sparse.csr_matrix(weights.astype(np.float32)), edges[1:-1]
+
+
+def cqt_n_fft(sample_rate, fmin=CQT_FMIN, bins_per_octave=CQT_BINS_PER_OCTAVE):
+    """FFT size that fits the longest (lowest) constant-Q kernel."""
+    q = 1.0 / (2 ** (1.0 / bins_per_octave) - 1)
+    return int(2 ** np.ceil(np.log2(q * sample_rate / fmin)))
+
+
+def cqt_n_bins(sample_rate, fmax=None, fmin=CQT_FMIN, bins_per_octave=CQT_BINS_PER_OCTAVE):
+    """Number of constant-Q bins between fmin and min(fmax, Nyquist)."""
+    fmax = min(fmax or sample_rate / 2, sample_rate / 2 * 0.95)
+    return max(1, int(np.floor(bins_per_octave * np.log2(fmax / fmin))))
+
+
+@functools.lru_cache(maxsize=16)
+def cqt_kernel(sample_rate, n_fft, n_bins, fmin=CQT_FMIN, bins_per_octave=CQT_BINS_PER_OCTAVE):
+    """
+    Spectral constant-Q kernel (Brown & Puckette): FFTs of the windowed complex
+    exponentials, thresholded and stored as a sparse (n_bins, n_fft // 2 + 1) matrix.
+    Returns (kernel, center_frequencies).
+    """
+    q = 1.0 / (2 ** (1.0 / bins_per_octave) - 1)
+    freqs = fmin * 2.0 ** (np.arange(n_bins) / bins_per_octave)
+    kernel = np.zeros((n_bins, n_fft // 2 + 1), dtype=np.complex64)
+    for k, f_k in enumerate(freqs):
+        length = min(n_fft, int(np.ceil(q * sample_rate / f_k)))
+        n = np.arange(length)
+        atom = np.hanning(length) / length * np.exp(2j * np.pi * q * n / length)
+        frame = np.zeros(n_fft, dtype=np.complex128)
+        start = (n_fft - length) // 2
+        frame[start:start + length] = atom
+        spectrum = np.fft.fft(frame)[:n_fft // 2 + 1]
+        # Почти всё ядро — несколько бинов около f_k; остальное отбрасываем
+        spectrum[np.abs(spectrum) < 0.0054 * np.abs(spectrum).max()] = 0
+        kernel[k] = np.conj(spectrum) / n_fft
+    return sparse.csr_matrix(kernel), freqs
+
+
+def stft_blocks(x, n_fft, hop, window=None):
+    """
+    Yields (first_frame_index, rfft_block) for `x` of shape (n,) or (n, channels).
+    rfft_block has shape (channels, frames, n_fft // 2 + 1), all channels being
+    transformed in one call (complex64 for float32 input). A block holds at most
+    STFT_BLOCK_FRAMES frames and about STFT_BLOCK_BYTES of spectrum.
+    """
+    x = x[:, None] if x.ndim == 1 else x
+    if len(x) < n_fft:
+        x = np.pad(x, ((0, n_fft - len(x)), (0, 0)))
+    frames = np.lib.stride_tricks.sliding_window_view(x, n_fft, axis=0)[::hop]  # (frames, channels, n_fft)
+    block_frames = max(1, min(STFT_BLOCK_FRAMES, STFT_BLOCK_BYTES // (n_fft * x.shape[1] * 8)))
+    for start in range(0, len(frames), block_frames):
+        block = frames[start:start + block_frames].transpose(1, 0, 2)
+        if window is not None:
+            block = block * window
+        yield start, sp_fft.rfft(block, axis=-1)
+
+
+def _apply_bank(bank, spectrum):
+    """(bands, bins) sparse bank @ (channels, frames, bins) block -> (channels, bands, frames)."""
+    channels, frames, bins = spectrum.shape
+    result = bank @ spectrum.reshape(channels * frames, bins).T
+    return result.reshape(bank.shape[0], channels, frames).transpose(1, 0, 2)
+
+
+def cqt_spectrogram(x, sample_rate, hop=1024, fmax=None, max_frames=CQT_MAX_FRAMES):
+    """
+    Constant-Q magnitude spectrogram of `x` with shape (n,) or (n, channels).
+    Returns (center_freqs, times, C); C has shape (n_bins, frames) for 1-D
+    input and (channels, n_bins, frames) otherwise. For long signals the hop
+    grows so that at most `max_frames` frames are computed.
+    """
+    n_fft = cqt_n_fft(sample_rate)
+    n_bins = cqt_n_bins(sample_rate, fmax)
+    kernel, centers = cqt_kernel(sample_rate, n_fft, n_bins)
+    hop = max(hop, int(np.ceil(max(len(x) - n_fft, 0) / max_frames)))
+    blocks = []
+    for _, spectrum in stft_blocks(x, n_fft, hop):
+        blocks.append(np.abs(_apply_bank(kernel, spectrum.astype(np.complex64, copy=False))))
+    C = np.concatenate(blocks, axis=-1)
+    times = (np.arange(C.shape[-1]) * hop + n_fft / 2) / sample_rate
+    return centers, times, C[0] if x.ndim == 1 else C
+
+
+# ----------------- Индекс активности (тишина / события) -----------------
+
+class ActivityIndex:
+    """
+    Frame-energy index of a signal, computed once at load time.
+
+    The signal is cut into `frame_sec` frames; a frame is active when its energy
+    (all channels together) is above `threshold_db`, or, by default, 12 dB above
+    the estimated noise floor. Active frames are widened by `hangover_sec` so
+    that event onsets and tails are not clipped.
+    """
+
+    def __init__(self, data, sample_rate, frame_sec=0.05, threshold_db=None, hangover_sec=0.25):
+        self.sample_rate = sample_rate
+        self.frame_len = max(1, int(sample_rate * frame_sec))
+        self.n_samples = len(data)
+        self.energy_db = self._frame_energy_db(data, self.frame_len)
+
+        if threshold_db is None:
+            # Шумовой порог: 10-й перцентиль энергии кадров + запас, но не ниже -60 dBFS
+            floor = np.percentile(self.energy_db, 10) if len(self.energy_db) else -120.0
+            threshold_db = max(floor + 12.0, -60.0)
+        self.threshold_db = threshold_db
+
+        active = self.energy_db > threshold_db
+        hangover = int(np.ceil(hangover_sec / frame_sec))
+        if hangover > 0 and active.any():
+            active = np.convolve(active, np.ones(2 * hangover + 1), mode="same") > 0
+        self.active = active
+
+        edges = np.diff(np.concatenate(([0], active.astype(np.int8), [0])))
+        # Границы событий в сэмплах: (start, end)
+        self.events = np.stack([np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)], axis=1) * self.frame_len
+        self.events = np.minimum(self.events, self.n_samples)
+
+    @staticmethod
+    def _frame_energy_db(data, frame_len):
+        n_frames = int(np.ceil(len(data) / frame_len))
+        channels = 1 if data.ndim == 1 else data.shape[1]
+        energy = np.empty(n_frames, dtype=np.float64)
+        full = len(data) // frame_len
+        if full:
+            frames = np.ascontiguousarray(data[:full * frame_len]).reshape(full, frame_len * channels)
+            # einsum считает сумму квадратов без временного массива data ** 2
+            energy[:full] = np.einsum("ij,ij->i", frames, frames) / (frame_len * channels)
+        if n_frames > full:
+            tail = np.asarray(data[full * frame_len:], dtype=np.float64)
+            energy[full] = np.mean(tail ** 2)
+        return 10 * np.log10(energy + 1e-12)
+
+    @property
+    def active_ratio(self):
+        return float(self.active.mean()) if len(self.active) else 0.0
+
+    def next_event(self, sample_index):
+        """Start (in samples) of the first event after `sample_index`, or None."""
+        starts = self.events[:, 0]
+        i = np.searchsorted(starts, sample_index, side="right")
+        return int(starts[i]) if i < len(starts) else None
+
+    def previous_event(self, sample_index):
+        """
+        Start of the event containing `sample_index`; within the first second of
+        an event, the start of the previous one. None if there is none.
+        """
+        starts = self.events[:, 0]
+        # Допуск в 1 сек, чтобы повторное нажатие уходило к предыдущему событию
+        i = np.searchsorted(starts, sample_index - self.sample_rate, side="left") - 1
+        return int(starts[i]) if i >= 0 else None
+
+    def sample_mask(self):
+        """Boolean mask over samples: True inside events."""
+        return np.repeat(self.active, self.frame_len)[:self.n_samples]
+
+    def collapse(self, data):
+        """
+        Returns `data` with silent stretches removed (events concatenated).
+        If everything or nothing is active the signal is returned as is.
+        """
+        if self.active.all() or not self.active.any():
+            return data
+        return data[self.sample_mask()]
+
+
+# ----------------- Статистика и сжатые представления сигнала -----------------
+
+def compute_statistics(data):
+    """
+    Min / max / mean / RMS per channel. Returns a dict of 1-D arrays
+    (one value per channel, also for mono data).
+    """
+    frames = data if data.ndim > 1 else data[:, None]
+    return {
+        "min": np.min(frames, axis=0),
+        "max": np.max(frames, axis=0),
+        "mean": np.mean(frames, axis=0),
+        # einsum — без float64-копии всего сигнала (как в ActivityIndex)
+        "rms": np.sqrt(np.einsum("ij,ij->j", frames, frames, dtype=np.float64) / len(frames)),
+    }
+
+
+def _block_edges(n, points):
+    points = max(1, min(points, n))
+    return np.linspace(0, n, num=points + 1).astype(np.int64)[:-1]
+
+
+def peak_envelope(data, sample_rate, points=1000):
+    """
+    Min/max envelope of the signal in `points` equal time blocks.
+    Returns (times, env_min, env_max), envelopes with shape (points, channels).
+    """
+    frames = data if data.ndim > 1 else data[:, None]
+    edges = _block_edges(len(frames), points)
+    env_min = np.minimum.reduceat(frames, edges, axis=0)
+    env_max = np.maximum.reduceat(frames, edges, axis=0)
+    return edges / sample_rate, env_min, env_max
+
+
+def average_spectrum(data, sample_rate, points=512, nperseg=4096):
+    """
+    Welch-averaged power spectrum in dB, reduced to `points` frequency bins
+    (peak of each bin). Returns (freqs, spectrum_db) with shape (points, channels).
+    """
+    frames = data if data.ndim > 1 else data[:, None]
+    nperseg = min(nperseg, len(frames))
+    freqs, pxx = welch(frames, sample_rate, nperseg=nperseg, axis=0)
+    edges = _block_edges(len(freqs), points)
+    reduced = np.maximum.reduceat(pxx, edges, axis=0)
+    return freqs[edges], 10 * np.log10(reduced + 1e-20)
@@ -0,0 +1,183 @@
+"""
+Hand-written DFT engines, for learning how the FFT works:
+
+  * matrix_dft  — the DFT as a matrix product X = W·x. Long signals are split
+    with the "four-step" decomposition N = N1·N2: the signal is cut into N1
+    frames of N2 samples, all frames are transformed with one batched matrix
+    product, and the steps are joined by cached twiddle factors. Splitting is
+    repeated until the pieces have at most DIRECT_MAX_SIZE points, so only
+    small cached DFT matrices are built, never the full N×N one. A prime
+    length cannot be split; it is turned into a circular convolution of a
+    smooth length (Bluestein's chirp-z algorithm), which is split as above.
+  * fft_radix2  — iterative radix-2 Cooley-Tukey FFT, vectorized over all
+    butterflies of a stage.
+  * benchmark   — times both against np.fft.fft and checks that they agree.
+"""
+import time
+import functools
+import numpy as np
+
+DIRECT_MAX_SIZE = 128            # до этого размера — прямое умножение на матрицу DFT
+BENCHMARK_LENGTHS = [2 ** p for p in range(8, 20)]
+
+
+@functools.lru_cache(maxsize=32)
+def dft_matrix(n):
+    """n×n DFT matrix W[k, m] = exp(-2πi·k·m/n) (symmetric)."""
+    k = np.arange(n)
+    return np.exp(-2j * np.pi * np.outer(k, k) / n)
+
+
+@functools.lru_cache(maxsize=32)
+def twiddle_matrix(n1, n2):
+    """Twiddle factors exp(-2πi·k1·m2/(n1·n2)) between the two DFT steps, shape (n1, n2)."""
+    return np.exp(-2j * np.pi * np.outer(np.arange(n1), np.arange(n2)) / (n1 * n2))
+
+
+def _split(n):
+    """Divisor of n closest to sqrt(n), or None if n is prime."""
+    for d in range(int(np.sqrt(n)), 1, -1):
+        if n % d == 0:
+            return d
+    return None
+
+
+@functools.lru_cache(maxsize=8)
+def _bluestein_chirp(n):
+    """Chirp w[k] = exp(-πi·k²/n), the convolution length m >= 2n-1 and the DFT of the chirp filter."""
+    k = np.arange(n)
+    # k² по модулю 2n — иначе фаза теряет точность на длинах в сотни тысяч
+    w = np.exp(-1j * np.pi * ((k * k) % (2 * n)) / n)
+    m = next_smooth_length(2 * n - 1)
+    h = np.zeros(m, dtype=np.complex128)
+    h[:n] = np.conj(w)
+    h[m - n + 1:] = np.conj(w[1:])[::-1]
+    return w, m, _dft_last_axis(h)
+
+
+def _bluestein_dft(x):
+    """DFT of a prime length along the last axis: X[k] = w[k]·((x·w) ⊛ conj(w))[k]."""
+    n = x.shape[-1]
+    w, m, h_spectrum = _bluestein_chirp(n)
+    a = np.zeros(x.shape[:-1] + (m,), dtype=np.complex128)
+    a[..., :n] = x * w
+    # Циклическая свёртка через DFT; обратное DFT — как conj(DFT(conj(y))) / m
+    conv = np.conj(_dft_last_axis(np.conj(_dft_last_axis(a) * h_spectrum))) / m
+    return conv[..., :n] * w
+
+
+def _dft_last_axis(x):
+    n = x.shape[-1]
+    if n <= DIRECT_MAX_SIZE:
+        return x @ dft_matrix(n)
+    n1 = _split(n)
+    if n1 is None:
+        return _bluestein_dft(x)
+    n2 = n // n1
+    # Четыре шага: x[n2·m1 + m2] -> матрица (n1, n2)
+    a = x.reshape(x.shape[:-1] + (n1, n2))
+    b = np.swapaxes(_dft_last_axis(np.swapaxes(a, -1, -2)), -1, -2)  # DFT по m1 -> (k1, m2)
+    b = b * twiddle_matrix(n1, n2)
+    c = _dft_last_axis(b)                                             # DFT по m2 -> (k1, k2)
+    # X[k1 + n1·k2] = c[k1, k2]
+    return np.swapaxes(c, -1, -2).reshape(x.shape[:-1] + (n,))
+
+
+def matrix_dft(x):
+    """DFT of `x` along the last axis via blocked matrix products (equals np.fft.fft for any length)."""
+    return _dft_last_axis(np.asarray(x, dtype=np.complex128))
+
+
+def fft_radix2(x):
+    """
+    Radix-2 decimation-in-time FFT along the last axis. The length must be a
+    power of two (see next_power_of_two for zero-padding).
+    """
+    x = np.asarray(x, dtype=np.complex128)
+    n = x.shape[-1]
+    if n < 1 or n & (n - 1):
+        raise ValueError(f"radix-2 FFT needs a power-of-two length, got {n}")
+    bits = n.bit_length() - 1
+    # Бит-реверсная перестановка входа
+    index = np.arange(n)
+    reversed_index = np.zeros(n, dtype=np.int64)
+    for b in range(bits):
+        reversed_index |= ((index >> b) & 1) << (bits - 1 - b)
+    X = x[..., reversed_index]
+    batch = x.shape[:-1]
+    size = 2
+    while size <= n:
+        half = size // 2
+        twiddle = np.exp(-2j * np.pi * np.arange(half) / size)
+        X = X.reshape(batch + (n // size, size))
+        even = X[..., :half]
+        odd = X[..., half:] * twiddle
+        X = np.concatenate([even + odd, even - odd], axis=-1)
+        size *= 2
+    return X.reshape(batch + (n,))
+
+
+def next_power_of_two(n):
+    return 1 << max(0, int(n - 1).bit_length())
+
+
+def next_smooth_length(n):
+    """Smallest length >= n whose prime factors are 2, 3, 5 and 7 (cheap for matrix_dft)."""
+    m = max(1, n)
+    while True:
+        k = m
+        for p in (2, 3, 5, 7):
+            while k % p == 0:
+                k //= p
+        if k == 1:
+            return m
+        m += 1
+
+
+ENGINES = {
+    "numpy": np.fft.fft,
+    "matrix": matrix_dft,
+    "radix2": fft_radix2,
+}
+
+
+def padded_length(n, engine):
+    """Length the signal is zero-padded to before running `engine` on it."""
+    if engine == "radix2":
+        return next_power_of_two(n)
+    if engine == "matrix":
+        return next_smooth_length(n)
+    return n
+
+
+def _best_time(func, x, repeats):
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(x)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark(lengths=BENCHMARK_LENGTHS, repeats=3, seed=0):
+    """
+    Times np.fft.fft, matrix_dft and fft_radix2 on random signals of the given
+    lengths. Returns a list of dicts with the length, the best time of each
+    engine in seconds and the max error of the manual engines relative to
+    np.fft (max |X - X_ref| / max |X_ref|).
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+    for n in lengths:
+        x = rng.standard_normal(n)
+        row = {"n": n, "time": {}, "error": {}}
+        row["time"]["numpy"], reference = _best_time(np.fft.fft, x, repeats)
+        scale = np.max(np.abs(reference)) or 1.0
+        for name in ("matrix", "radix2"):
+            if name == "radix2" and n & (n - 1):
+                continue
+            row["time"][name], result = _best_time(ENGINES[name], x, repeats)
+            row["error"][name] = float(np.max(np.abs(result - reference)) / scale)
+        results.append(row)
+    return results
@@ -0,0 +1,358 @@
+"""
+Spectral-peak landmark fingerprints for finding duplicates and near-duplicates
+(re-encodes, trimmed copies) in a library.
+
+Each file is downmixed, resampled to FP_SAMPLE_RATE and run through the STFT
+(dsp.stft_blocks). Local spectral peaks are paired into landmarks
+(f1, f2, dt) that are packed into 24-bit hashes, and stored with the file id
+and anchor time in an inverted index on disk.
+
+The index is a directory with a JSON catalog of files and a list of segments.
+Every indexing run appends one segment: three .npy arrays sorted by hash
+(hashes, file ids, anchor frames) that are memory-mapped at query time and
+searched with np.searchsorted. `compact` merges all segments into one.
+
+    python fingerprint.py index library.fpi /music --jobs 8
+    python fingerprint.py query library.fpi clip.mp3
+    python fingerprint.py compact library.fpi
+"""
+import os
+import sys
+import json
+import argparse
+import multiprocessing
+import numpy as np
+from scipy.ndimage import maximum_filter
+import audio_io
+import dsp
+
+FP_SAMPLE_RATE = 11025
+FP_N_FFT = 1024
+FP_HOP = 512
+FP_BINS = 512                 # используем бины 0..511 (9 бит на частоту)
+PEAK_NEIGHBORHOOD = (21, 9)   # (бины, кадры) — окрестность локального максимума
+PEAKS_PER_SECOND = 10
+FAN_OUT = 5                   # сколько следующих пиков берём в пару к каждому «якорю»
+MAX_DT = 63                   # кадров между пиками в паре (6 бит)
+MAX_POSTINGS = 50000          # слишком частые хэши не несут информации — пропускаем
+MIN_MATCHES = 5
+
+CATALOG = "catalog.json"
+
+
+def frames_to_seconds(frames):
+    return np.asarray(frames) * FP_HOP / FP_SAMPLE_RATE
+
+
+def _find_peaks(magnitude, first_frame):
+    """Local maxima of a (bins, frames) log-magnitude block -> (frames, bins)."""
+    is_peak = (maximum_filter(magnitude, size=PEAK_NEIGHBORHOOD, mode="constant", cval=-np.inf) == magnitude)
+    is_peak &= magnitude > magnitude.min() + 1e-3
+    bins, frames = np.nonzero(is_peak)
+    return frames + first_frame, bins, magnitude[bins, frames]
+
+
+def extract_peaks(data, sample_rate):
+    """
+    Spectral peak constellation of the signal: returns (frames, bins) of the
+    strongest local maxima, about PEAKS_PER_SECOND per second.
+    """
+    mono = data.mean(axis=1) if data.ndim > 1 else data
+    mono = dsp.resample_to(mono.astype(np.float32), sample_rate, FP_SAMPLE_RATE)
+    window = np.hanning(FP_N_FFT).astype(np.float32)
+    pad = PEAK_NEIGHBORHOOD[1] // 2
+    all_frames, all_bins, all_mags = [], [], []
+
+    def collect(start, magnitude, first, stop):
+        # Пики ищем в блоке вместе с краями соседних, а берём только кадры [first, stop)
+        f, b, m = _find_peaks(magnitude, start)
+        keep = (f >= first) & (f < stop)
+        all_frames.append(f[keep])
+        all_bins.append(b[keep])
+        all_mags.append(m[keep])
+
+    previous = None   # (первый кадр с учётом левого края, первый «свой» кадр, магнитуды)
+    for start, spectrum in dsp.stft_blocks(mono, FP_N_FFT, FP_HOP, window):
+        magnitude = np.log(np.abs(spectrum[0, :, :FP_BINS]).T + 1e-6)
+        if previous is None:
+            previous = (start, start, magnitude)
+            continue
+        padded_start, own_start, prev_mag = previous
+        collect(padded_start, np.hstack([prev_mag, magnitude[:, :pad]]), own_start, start)
+        previous = (start - pad, start, np.hstack([prev_mag[:, -pad:], magnitude]))
+    if previous is not None:
+        collect(previous[0], previous[2], previous[1], np.inf)
+    if not all_frames:
+        return np.zeros(0, np.int64), np.zeros(0, np.int64)
+    frames, bins, mags = np.concatenate(all_frames), np.concatenate(all_bins), np.concatenate(all_mags)
+
+    # В каждой секунде оставляем PEAKS_PER_SECOND самых сильных пиков
+    frames_per_second = FP_SAMPLE_RATE / FP_HOP
+    window_id = (frames / frames_per_second).astype(np.int64)
+    order = np.lexsort((-mags, window_id))
+    window_sorted = window_id[order]
+    first_in_window = np.searchsorted(window_sorted, window_sorted, side="left")
+    rank = np.arange(len(order)) - first_in_window
+    selected = order[rank < PEAKS_PER_SECOND]
+    selected = selected[np.lexsort((bins[selected], frames[selected]))]
+    return frames[selected], bins[selected]
+
+
+def landmark_hashes(frames, bins):
+    """
+    Pairs every peak with the next FAN_OUT peaks in time. Returns (hashes, anchor_frames);
+    a hash packs f1 (9 bits), f2 (9 bits) and dt (6 bits).
+    """
+    hashes, anchors = [], []
+    for k in range(1, FAN_OUT + 1):
+        if len(frames) <= k:
+            break
+        dt = frames[k:] - frames[:-k]
+        valid = (dt >= 1) & (dt <= MAX_DT)
+        f1, f2 = bins[:-k][valid], bins[k:][valid]
+        hashes.append((f1 << 15) | (f2 << 6) | dt[valid])
+        anchors.append(frames[:-k][valid])
+    if not hashes:
+        return np.zeros(0, np.uint32), np.zeros(0, np.uint32)
+    return np.concatenate(hashes).astype(np.uint32), np.concatenate(anchors).astype(np.uint32)
+
+
+def fingerprint(data, sample_rate):
+    """(hashes, anchor_frames) of a decoded signal."""
+    return landmark_hashes(*extract_peaks(data, sample_rate))
+
+
+def fingerprint_file(file_path):
+    """Worker entry point: returns (file_path, hashes, anchors, duration, error)."""
+    try:
+        data, sample_rate, _ = audio_io.load_audio(file_path)
+        hashes, anchors = fingerprint(data, sample_rate)
+        return file_path, hashes, anchors, len(data) / sample_rate, None
+    except Exception as e:
+        return file_path, None, None, 0.0, str(e)
+
+
+class FingerprintIndex:
+    """Inverted landmark index stored in a directory (see the module docstring)."""
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        os.makedirs(index_dir, exist_ok=True)
+        catalog_path = os.path.join(index_dir, CATALOG)
+        if os.path.exists(catalog_path):
+            with open(catalog_path, encoding="utf-8") as f:
+                self.catalog = json.load(f)
+        else:
+            self.catalog = {"files": [], "segments": [], "next_segment": 0}
+        self._segments = None
+        self._by_path = {entry["path"]: i for i, entry in enumerate(self.catalog["files"])
+                         if not entry.get("deleted")}
+
+    # ----------------- Запись -----------------
+    def _save_catalog(self):
+        tmp_path = os.path.join(self.index_dir, CATALOG + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.catalog, f)
+        os.replace(tmp_path, os.path.join(self.index_dir, CATALOG))
+
+    def _segment_path(self, name, part):
+        return os.path.join(self.index_dir, f"{name}.{part}.npy")
+
+    def _write_segment(self, hashes, file_ids, anchors):
+        order = np.argsort(hashes, kind="stable")
+        name = f"seg_{self.catalog['next_segment']:06d}"
+        np.save(self._segment_path(name, "hashes"), hashes[order])
+        np.save(self._segment_path(name, "files"), file_ids[order])
+        np.save(self._segment_path(name, "frames"), anchors[order])
+        self.catalog["next_segment"] += 1
+        self.catalog["segments"].append(name)
+        self._segments = None
+        return name
+
+    def needs_indexing(self, file_path):
+        """False if the file is indexed and unchanged since (same size and mtime)."""
+        i = self._by_path.get(os.path.abspath(file_path))
+        if i is None:
+            return True
+        entry = self.catalog["files"][i]
+        stat = os.stat(file_path)
+        return entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime
+
+    def add_batch(self, results):
+        """
+        Adds fingerprint_file() results as one new segment. Re-indexed files get a
+        new id; their old id is marked deleted. Returns the number of files added.
+        """
+        hashes, file_ids, anchors = [], [], []
+        for file_path, h, a, duration, error in results:
+            if error is not None or h is None:
+                continue
+            path = os.path.abspath(file_path)
+            if path in self._by_path:
+                self.catalog["files"][self._by_path[path]]["deleted"] = True
+            stat = os.stat(file_path)
+            file_id = len(self.catalog["files"])
+            self.catalog["files"].append({"path": path, "duration": duration,
+                                          "size": stat.st_size, "mtime": stat.st_mtime})
+            self._by_path[path] = file_id
+            hashes.append(h)
+            anchors.append(a)
+            file_ids.append(np.full(len(h), file_id, dtype=np.uint32))
+        if file_ids:
+            self._write_segment(np.concatenate(hashes), np.concatenate(file_ids), np.concatenate(anchors))
+            self._save_catalog()
+        return len(file_ids)
+
+    def compact(self):
+        """Merges all segments into one and drops postings of deleted files."""
+        segments = self._load_segments()
+        if len(segments) <= 1:
+            return
+        old = list(self.catalog["segments"])
+        hashes = np.concatenate([s[0] for s in segments])
+        file_ids = np.concatenate([s[1] for s in segments])
+        anchors = np.concatenate([s[2] for s in segments])
+        alive = ~self._deleted_mask()[file_ids]
+        self._segments = None
+        self.catalog["segments"] = []
+        self._write_segment(hashes[alive], file_ids[alive], anchors[alive])
+        self._save_catalog()
+        del segments, hashes, file_ids, anchors
+        for name in old:
+            for part in ("hashes", "files", "frames"):
+                try:
+                    os.remove(self._segment_path(name, part))
+                except OSError:
+                    pass
+
+    # ----------------- Поиск -----------------
+    def _load_segments(self):
+        if self._segments is None:
+            self._segments = [
+                tuple(np.load(self._segment_path(name, part), mmap_mode="r")
+                      for part in ("hashes", "files", "frames"))
+                for name in self.catalog["segments"]
+            ]
+        return self._segments
+
+    def _deleted_mask(self):
+        return np.array([bool(entry.get("deleted")) for entry in self.catalog["files"]] or [False])
+
+    def query(self, hashes, anchors, top=10, min_matches=MIN_MATCHES):
+        """
+        Finds indexed files sharing landmarks with the query. Returns a list of dicts
+        (path, matches, score, offset_sec) sorted by matches; offset_sec is where the
+        query starts inside the matched file.
+        """
+        if len(hashes) == 0 or not self.catalog["segments"]:
+            return []
+        order = np.argsort(hashes)
+        q_hashes = np.asarray(hashes)[order]
+        q_frames = np.asarray(anchors, dtype=np.int64)[order]
+        keys = []
+        for seg_hashes, seg_files, seg_frames in self._load_segments():
+            lo = np.searchsorted(seg_hashes, q_hashes, side="left")
+            hi = np.searchsorted(seg_hashes, q_hashes, side="right")
+            counts = hi - lo
+            counts[counts > MAX_POSTINGS] = 0
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            # Все диапазоны [lo, hi) одним массивом индексов
+            query_index = np.repeat(np.arange(len(q_hashes)), counts)
+            starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+            posting = starts + np.arange(total)
+            files = np.asarray(seg_files[posting], dtype=np.int64)
+            offsets = np.asarray(seg_frames[posting], dtype=np.int64) - q_frames[query_index]
+            # Ключ (файл, смещение): совпадения с одинаковым смещением — одна и та же запись
+            keys.append((files << 32) | (offsets + (1 << 31)))
+        if not keys:
+            return []
+        unique_keys, votes = np.unique(np.concatenate(keys), return_counts=True)
+        files = unique_keys >> 32
+        offsets = (unique_keys & 0xFFFFFFFF) - (1 << 31)
+        # Лучшее смещение для каждого файла
+        order = np.lexsort((-votes, files))
+        first = np.concatenate(([True], files[order][1:] != files[order][:-1]))
+        best = order[first]
+        deleted = self._deleted_mask()
+        best = best[(votes[best] >= min_matches) & ~deleted[files[best]]]
+        best = best[np.argsort(-votes[best])][:top]
+        return [
+            {
+                "path": self.catalog["files"][files[i]]["path"],
+                "matches": int(votes[i]),
+                "score": float(votes[i] / len(hashes)),
+                "offset_sec": float(frames_to_seconds(offsets[i])),
+            }
+            for i in best
+        ]
+
+    def query_file(self, file_path, top=10):
+        data, sample_rate, _ = audio_io.load_audio(file_path)
+        return self.query(*fingerprint(data, sample_rate), top=top)
+
+    def __len__(self):
+        return len(self._by_path)
+
+
+def index_files(index_dir, files, jobs=None, batch_size=500, progress=None):
+    """
+    Fingerprints `files` in a process pool and appends them to the index, one
+    segment per `batch_size` files. Unchanged files are skipped. Returns the
+    number of files added.
+    """
+    index = FingerprintIndex(index_dir)
+    todo = [f for f in files if index.needs_indexing(f)]
+    added = 0
+    with multiprocessing.Pool(processes=jobs or os.cpu_count() or 1) as pool:
+        batch = []
+        for done, result in enumerate(pool.imap_unordered(fingerprint_file, todo, chunksize=4), start=1):
+            batch.append(result)
+            if progress is not None:
+                progress(done, len(todo), result[0], result[4])
+            if len(batch) >= batch_size:
+                added += index.add_batch(batch)
+                batch = []
+        if batch:
+            added += index.add_batch(batch)
+    return added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Spectral fingerprint index for duplicate detection.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    p_index = commands.add_parser("index", help="add files / directories to the index")
+    p_index.add_argument("index_dir")
+    p_index.add_argument("inputs", nargs="+")
+    p_index.add_argument("-j", "--jobs", type=int, default=None)
+    p_index.add_argument("--batch-size", type=int, default=500, help="files per index segment")
+    p_query = commands.add_parser("query", help="find files matching a query file")
+    p_query.add_argument("index_dir")
+    p_query.add_argument("file")
+    p_query.add_argument("--top", type=int, default=10)
+    p_compact = commands.add_parser("compact", help="merge all index segments into one")
+    p_compact.add_argument("index_dir")
+    args = parser.parse_args(argv)
+
+    if args.command == "index":
+        def progress(done, total, file_path, error):
+            status = f"FAILED: {error}" if error else "ok"
+            print(f"[{done}/{total}] {file_path} — {status}")
+
+        added = index_files(args.index_dir, audio_io.collect_files(args.inputs), jobs=args.jobs,
+                            batch_size=args.batch_size, progress=progress)
+        print(f"Indexed {added} files ({len(FingerprintIndex(args.index_dir))} in the index)")
+    elif args.command == "query":
+        matches = FingerprintIndex(args.index_dir).query_file(args.file, top=args.top)
+        if not matches:
+            print("No matches.")
+        for m in matches:
+            print(f"{m['matches']:6d} matches  offset {m['offset_sec']:9.2f} sec  {m['path']}")
+    else:
+        FingerprintIndex(args.index_dir).compact()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Headless plot export: renders the analyzer views for many files to PNG/SVG
+without a display. Uses the same drawing functions as the GUI (plots.py)
+with the Agg backend, spread over a pool of worker processes.
+
+    python headless_export.py music/ -o thumbs --views waveform spectrogram --jobs 8
+"""
+import os
+import sys
+import time
+import argparse
+import multiprocessing
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import audio_io
+import pipeline
+import plots
+
+
+def output_path(out_dir, file_path, view, fmt):
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(out_dir, f"{stem}_{view}.{fmt}")
+
+
+def render_view(graph, view, figsize, dpi, max_freq=None, skip_silence=False, channels=None):
+    """Draws one view of an analysis graph (see pipeline.py) on a fresh Agg figure and returns the figure."""
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+    pipeline.render_view(graph, view, figure, max_freq=max_freq, skip_silence=skip_silence, channels=channels)
+    return figure
+
+
+def export_file(job):
+    """
+    Worker entry point. Decodes one file once and saves every requested view;
+    the views share the intermediate stages of one analysis graph.
+    Returns (file_path, saved_paths, error_message, timings_text).
+    """
+    (file_path, out_dir, views, fmt, figsize, dpi, skip_existing, max_freq, skip_silence,
+     channel_spec, with_timings) = job
+    targets = {view: output_path(out_dir, file_path, view, fmt) for view in views}
+    if skip_existing:
+        targets = {view: path for view, path in targets.items() if not os.path.exists(path)}
+        if not targets:
+            return file_path, [], None, None
+    saved = []
+    graph = None
+    try:
+        graph = pipeline.AnalysisGraph.from_file(file_path)
+        channels = None
+        if channel_spec and graph.n_channels > 1:
+            channels = plots.parse_channel_list(channel_spec, graph.n_channels)
+        for view, path in targets.items():
+            figure = render_view(graph, view, figsize, dpi, max_freq, skip_silence, channels)
+            figure.savefig(path, format=fmt, dpi=dpi)
+            saved.append(path)
+    except Exception as e:
+        return file_path, saved, str(e), None
+    return file_path, saved, None, graph.format_timings() if with_timings else None
+
+
+def export_files(files, out_dir, views=tuple(pipeline.VIEWS), fmt="png", figsize=(6, 4), dpi=100,
+                 jobs=None, skip_existing=False, max_freq=None, skip_silence=False, channels=None,
+                 timings=False, progress=None):
+    """
+    Renders `views` for every file in `files` into `out_dir` using `jobs` processes
+    (all cores by default). With `max_freq` the spectral views are computed on a
+    decimated copy of the signal; with `skip_silence` they only see the
+    non-silent stretches (see dsp.ActivityIndex). `channels` is a selection like
+    "1-4, 9"; by default the first plots.MAX_VISIBLE_CHANNELS are drawn. With
+    `timings` the per-stage pipeline timings of each file are passed to
+    `progress(done, total, file_path, error, timings_text)`, which is called
+    after each file. Returns the list of (file_path, error) failures.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    job_list = [(f, out_dir, list(views), fmt, tuple(figsize), dpi, skip_existing, max_freq, skip_silence,
+                 channels, timings)
+                for f in files]
+    jobs = jobs or os.cpu_count() or 1
+    failures = []
+    if jobs == 1:
+        results = map(export_file, job_list)
+        pool = None
+    else:
+        # maxtasksperchild — чтобы matplotlib не накапливал память за ночь работы
+        pool = multiprocessing.Pool(processes=jobs, maxtasksperchild=200)
+        chunksize = max(1, min(16, len(job_list) // (jobs * 4)))
+        results = pool.imap_unordered(export_file, job_list, chunksize=chunksize)
+    try:
+        for done, (file_path, _, error, timings_text) in enumerate(results, start=1):
+            if error is not None:
+                failures.append((file_path, error))
+            if progress is not None:
+                progress(done, len(job_list), file_path, error, timings_text)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export Sound Analyzer plots without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="audio files or directories")
+    parser.add_argument("-o", "--out", required=True, help="output directory")
+    parser.add_argument("--views", nargs="+", choices=list(pipeline.VIEWS), default=list(pipeline.VIEWS))
+    parser.add_argument("--format", choices=["png", "svg"], default="png")
+    parser.add_argument("--width", type=float, default=6.0, help="figure width in inches")
+    parser.add_argument("--height", type=float, default=4.0, help="figure height in inches")
+    parser.add_argument("--dpi", type=int, default=100)
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--skip-existing", action="store_true", help="do not re-render existing images")
+    parser.add_argument("--max-freq", type=float, default=None,
+                        help="max frequency of interest in Hz; spectral views are decimated to this band")
+    parser.add_argument("--skip-silence", action="store_true",
+                        help="drop silent stretches before computing the spectral views")
+    parser.add_argument("--channels", default=None,
+                        help=f"channels to draw, e.g. '1-4,9' (default: first {plots.MAX_VISIBLE_CHANNELS})")
+    parser.add_argument("--timings", action="store_true", help="print per-stage pipeline timings for each file")
+    args = parser.parse_args(argv)
+
+    files = audio_io.collect_files(args.inputs)
+    if not files:
+        print("No audio files found.")
+        return 1
+
+    start = time.perf_counter()
+
+    def progress(done, total, file_path, error, timings_text):
+        status = f"FAILED: {error}" if error else "ok"
+        print(f"[{done}/{total}] {file_path} — {status}")
+        if timings_text:
+            print(timings_text)
+
+    failures = export_files(files, args.out, views=args.views, fmt=args.format,
+                            figsize=(args.width, args.height), dpi=args.dpi,
+                            jobs=args.jobs, skip_existing=args.skip_existing, max_freq=args.max_freq,
+                            skip_silence=args.skip_silence, channels=args.channels, timings=args.timings,
+                            progress=progress)
+    elapsed = time.perf_counter() - start
+    print(f"Exported {len(files) - len(failures)} of {len(files)} files in {elapsed:.1f} sec")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
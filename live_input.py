@@ -0,0 +1,463 @@
+"""
+Live input analysis. A SampleSource delivers (frames, channels) float32 blocks
+from a producer thread into a bounded queue; LiveAnalyzer consumes them and
+keeps the rolling state of the live views (waveform history, level meters,
+spectrum, spectrogram).
+
+Sources:
+  * SoundCardSource — audio interface input via the optional `sounddevice` package
+  * FileSource      — replays an audio file at real-time pace (no audio hardware needed)
+  * PipeSource      — raw interleaved PCM from a pipe, FIFO or stdin, e.g.
+        ffmpeg -i in.mp3 -f s16le -ac 2 -ar 48000 - | python live_input.py pipe --rate 48000 --channels 2
+
+When the consumer falls behind, the oldest queued blocks are dropped (and
+counted) so the display latency stays bounded.
+
+    python live_input.py file recording.wav --seconds 20 --render
+runs the whole pipeline without the GUI and prints throughput, dropped blocks
+and the end-to-end latency.
+"""
+import sys
+import time
+import queue
+import argparse
+import threading
+from abc import ABC, abstractmethod
+import numpy as np
+import soundfile as sf
+import audio_io
+
+try:
+    import sounddevice
+except (ImportError, OSError):
+    # Необязательная зависимость (нужен ещё PortAudio): без неё доступны только FileSource / PipeSource
+    sounddevice = None
+
+SOUND_CARD_AVAILABLE = sounddevice is not None
+
+BLOCK_FRAMES = 1024         # ~11 мс при 96 кГц
+MAX_QUEUE_SEC = 0.25        # больше этого не копим — старые блоки выбрасываются
+HISTORY_SEC = 5.0           # длина окна осциллограммы
+WAVEFORM_POINTS = 500       # столбцов огибающей min/max на окно осциллограммы (~ ширина осей в пикселях)
+SPECTRUM_POINTS = 512       # точек спектра на экране (максимум по соседним бинам)
+SPECTROGRAM_SEC = 10.0
+SPECTROGRAM_COLUMNS_PER_SEC = 25
+SPECTROGRAM_ROWS = 256
+LIVE_N_FFT = 2048
+PEAK_HOLD_SEC = 1.5         # время спада индикатора пика
+FLOOR_DB = -120.0
+
+PCM_DTYPES = {"int16": 32768.0, "int32": 2147483648.0, "float32": 1.0}
+
+
+class SampleSource(ABC):
+    """
+    Base class of the live sources. The producer side calls _push(block);
+    the consumer calls read_available(), which never blocks.
+    """
+
+    name = "source"
+
+    def __init__(self, sample_rate, channels, block_frames=BLOCK_FRAMES):
+        self.sample_rate = int(sample_rate)
+        self.channels = int(channels)
+        self.block_frames = block_frames
+        max_blocks = max(2, int(np.ceil(MAX_QUEUE_SEC * self.sample_rate / block_frames)))
+        self._queue = queue.Queue(maxsize=max_blocks)
+        self.total_blocks = 0
+        self.dropped_blocks = 0
+        self.finished = False
+        self.error = None
+
+    @abstractmethod
+    def start(self):
+        """Starts delivering blocks (returns immediately)."""
+
+    @abstractmethod
+    def stop(self):
+        """Stops the source and releases the device, file or stream."""
+
+    def _push(self, block, capture_time=None):
+        item = (time.perf_counter() if capture_time is None else capture_time, block)
+        self.total_blocks += 1
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.dropped_blocks += 1
+                except queue.Empty:
+                    pass
+
+    def read_available(self):
+        """All queued blocks as a list of (capture_time, block), oldest first."""
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    @property
+    def exhausted(self):
+        """True when the source has ended and everything it produced was read."""
+        return self.finished and self._queue.empty()
+
+
+class _PacedSource(SampleSource):
+    """Producer thread that delivers the blocks of _blocks() at `speed` × real-time pace."""
+
+    def __init__(self, sample_rate, channels, block_frames=BLOCK_FRAMES, speed=1.0):
+        super().__init__(sample_rate, channels, block_frames)
+        self.speed = speed
+        self._stop = threading.Event()
+        self._thread = None
+
+    @abstractmethod
+    def _blocks(self):
+        """Yields float32 blocks shaped (frames, channels)."""
+
+    def _close(self):
+        pass
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            start = time.perf_counter()
+            delivered = 0
+            for block in self._blocks():
+                delivered += len(block)
+                # Блок «приходит», когда он был бы целиком записан в реальном времени
+                due = start + delivered / (self.sample_rate * self.speed)
+                delay = due - time.perf_counter()
+                if delay > 0 and self._stop.wait(delay):
+                    break
+                if self._stop.is_set():
+                    break
+                self._push(block, due)
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            self.finished = True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._close()
+
+
+class FileSource(_PacedSource):
+    """Replays an audio file block by block at real-time pace (optionally looped)."""
+
+    def __init__(self, file_path, block_frames=BLOCK_FRAMES, speed=1.0, loop=False):
+        self.file_path = file_path
+        self.name = f"Replay: {file_path}"
+        self.loop = loop
+        self._file = None
+        self._data = None
+        self._pos = 0
+        ext = audio_io.get_file_format(file_path)
+        if ext in audio_io.NATIVE_FORMATS:
+            self._file = sf.SoundFile(file_path)
+            sample_rate, channels = self._file.samplerate, self._file.channels
+        else:
+            # mp3 / m4a читаем целиком через pydub
+            data, sample_rate, channels = audio_io.load_audio(file_path)
+            self._data = data.reshape(len(data), channels)
+        super().__init__(sample_rate, channels, block_frames, speed)
+
+    def _blocks(self):
+        while not self._stop.is_set():
+            if self._file is not None:
+                block = self._file.read(self.block_frames, dtype="float32", always_2d=True)
+            else:
+                block = self._data[self._pos:self._pos + self.block_frames]
+                self._pos += len(block)
+            if len(block):
+                yield block
+            if len(block) < self.block_frames:
+                if not self.loop:
+                    return
+                if self._file is not None:
+                    self._file.seek(0)
+                else:
+                    self._pos = 0
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class PipeSource(_PacedSource):
+    """Raw interleaved PCM (int16, int32 or float32) from a binary stream such as a pipe or stdin."""
+
+    def __init__(self, stream, sample_rate, channels, dtype="int16", block_frames=BLOCK_FRAMES, speed=1.0):
+        if dtype not in PCM_DTYPES:
+            raise ValueError(f"unsupported PCM type {dtype}; use one of {', '.join(PCM_DTYPES)}")
+        self.name = f"Pipe: {getattr(stream, 'name', 'stream')}"
+        self.stream = stream
+        self.dtype = np.dtype(dtype)
+        self.scale = PCM_DTYPES[dtype]
+        super().__init__(sample_rate, channels, block_frames, speed)
+
+    def _blocks(self):
+        frame_bytes = self.dtype.itemsize * self.channels
+        block_bytes = frame_bytes * self.block_frames
+        while not self._stop.is_set():
+            chunk = self.stream.read(block_bytes)
+            if not chunk:
+                return
+            usable = len(chunk) - len(chunk) % frame_bytes
+            block = np.frombuffer(chunk[:usable], dtype=self.dtype).reshape(-1, self.channels)
+            yield block.astype(np.float32) / self.scale
+
+    def _close(self):
+        try:
+            self.stream.close()
+        except OSError:
+            pass
+
+
+class SoundCardSource(SampleSource):
+    """Audio interface input through `sounddevice` (PortAudio); overflows count as dropped blocks."""
+
+    def __init__(self, device=None, sample_rate=None, channels=None, block_frames=BLOCK_FRAMES):
+        if sounddevice is None:
+            raise RuntimeError("Sound card input needs the 'sounddevice' package (pip install sounddevice).")
+        info = sounddevice.query_devices(device, "input")
+        self.name = f"Input: {info['name']}"
+        sample_rate = sample_rate or int(info["default_samplerate"])
+        channels = channels or int(info["max_input_channels"])
+        super().__init__(sample_rate, channels, block_frames)
+        self._stream = sounddevice.InputStream(
+            device=device, channels=self.channels, samplerate=self.sample_rate,
+            blocksize=block_frames, dtype="float32", latency="low", callback=self._callback)
+
+    def _callback(self, indata, frames, time_info, status):
+        if status.input_overflow:
+            self.dropped_blocks += 1
+        self._push(indata.copy())
+
+    def start(self):
+        self._stream.start()
+
+    def stop(self):
+        self._stream.stop()
+        self._stream.close()
+        self.finished = True
+
+
+class LiveAnalyzer:
+    """
+    Rolling analysis state of the live views. process() runs for every block
+    and updates the ring buffer, the min/max waveform envelope, levels and
+    spectrogram columns incrementally; snapshot() adds the spectrum of the
+    latest frame at the display rate.
+    """
+
+    def __init__(self, sample_rate, channels, history_sec=HISTORY_SEC, n_fft=LIVE_N_FFT,
+                 spectrogram_sec=SPECTROGRAM_SEC):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.history_sec = history_sec
+        self.spectrogram_sec = spectrogram_sec
+        self.n_fft = n_fft
+        self.window = np.hanning(n_fft).astype(np.float32)
+        self.spectrum_freqs = np.fft.rfftfreq(n_fft, d=1 / sample_rate)[:-1:n_fft // 2 // SPECTRUM_POINTS]
+        self.history = np.zeros((max(n_fft, int(history_sec * sample_rate)), channels), dtype=np.float32)
+        self.write_pos = 0
+        self.total_frames = 0
+        # Огибающая осциллограммы: кольцо из WAVEFORM_POINTS столбцов по env_frames сэмплов
+        self.env_frames = max(1, int(history_sec * sample_rate) // WAVEFORM_POINTS)
+        self.env_min = np.zeros((WAVEFORM_POINTS, channels), dtype=np.float32)
+        self.env_max = np.zeros((WAVEFORM_POINTS, channels), dtype=np.float32)
+        self.env_pos = 0
+        self._env_pending = np.zeros((0, channels), dtype=np.float32)
+        self.rms_db = np.full(channels, FLOOR_DB)
+        self.peak_db = np.full(channels, FLOOR_DB)
+        self.hold_db = np.full(channels, FLOOR_DB)
+        # Спектрограмма (смесь каналов): кольцо столбцов по SPECTROGRAM_ROWS полос
+        self.hop = max(n_fft // 4, int(sample_rate / SPECTROGRAM_COLUMNS_PER_SEC))
+        self.spectrogram = np.full((SPECTROGRAM_ROWS, int(spectrogram_sec * sample_rate / self.hop)),
+                                   FLOOR_DB, dtype=np.float32)
+        self.column_pos = 0
+        self.columns_done = 0
+        self.latest_capture_time = None
+
+    def recent(self, frames):
+        """The last `frames` samples in time order, shape (frames, channels)."""
+        frames = min(frames, len(self.history))
+        start = self.write_pos - frames
+        if start >= 0:
+            return self.history[start:self.write_pos]
+        return np.concatenate([self.history[start:], self.history[:self.write_pos]])
+
+    @staticmethod
+    def _reduce_bins(power_db, points):
+        """Peak over groups of neighbouring bins: (n_fft // 2 + 1, ...) -> (points, ...); Nyquist bin dropped."""
+        bins = power_db[:-1]
+        return bins.reshape((points, -1) + bins.shape[1:]).max(axis=1)
+
+    def _power_db(self, frames):
+        spectrum = np.fft.rfft(frames * self.window[:, None], axis=0)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2) / (np.sum(self.window) ** 2 / 4)
+        return 10 * np.log10(power + 1e-12)
+
+    def process(self, capture_time, block):
+        n = len(block)
+        size = len(self.history)
+        if n >= size:
+            self.history[:] = block[-size:]
+            self.write_pos = 0
+        else:
+            end = self.write_pos + n
+            if end <= size:
+                self.history[self.write_pos:end] = block
+            else:
+                split = size - self.write_pos
+                self.history[self.write_pos:] = block[:split]
+                self.history[:n - split] = block[split:]
+            self.write_pos = end % size
+        self.total_frames += n
+
+        # Огибающая: только целые столбцы, остаток ждёт следующего блока
+        pending = np.concatenate([self._env_pending, block]) if len(self._env_pending) else block
+        k = len(pending) // self.env_frames
+        if k:
+            columns = pending[:k * self.env_frames].reshape(k, self.env_frames, self.channels)
+            index = (self.env_pos + np.arange(k)) % WAVEFORM_POINTS
+            self.env_min[index] = columns.min(axis=1)
+            self.env_max[index] = columns.max(axis=1)
+            self.env_pos = (self.env_pos + k) % WAVEFORM_POINTS
+        self._env_pending = pending[k * self.env_frames:].copy()
+
+        # Уровни по всем каналам сразу
+        peak = np.max(np.abs(block), axis=0)
+        rms = np.sqrt(np.einsum("ij,ij->j", block, block) / max(n, 1))
+        self.peak_db = 20 * np.log10(np.maximum(peak, 1e-6))
+        self.rms_db = 20 * np.log10(np.maximum(rms, 1e-6))
+        decay = 20 * n / (self.sample_rate * PEAK_HOLD_SEC)   # ~20 дБ за PEAK_HOLD_SEC
+        self.hold_db = np.maximum(self.peak_db, self.hold_db - decay)
+
+        # Новые столбцы спектрограммы: столбец k — кадр [k * hop, k * hop + n_fft)
+        while self.columns_done * self.hop + self.n_fft <= self.total_frames:
+            back = self.total_frames - (self.columns_done * self.hop + self.n_fft)
+            if back + self.n_fft <= len(self.history):
+                frames = self.recent(self.n_fft + back)[:self.n_fft]
+                power_db = self._power_db(frames).mean(axis=1)
+                column = self._reduce_bins(power_db, SPECTROGRAM_ROWS)
+            else:
+                # Блок длиннее кольца — этот кадр уже перезаписан
+                column = FLOOR_DB
+            self.spectrogram[:, self.column_pos] = column
+            self.column_pos = (self.column_pos + 1) % self.spectrogram.shape[1]
+            self.columns_done += 1
+
+        self.latest_capture_time = capture_time
+
+    def snapshot(self, channels=None):
+        """
+        Current state for drawing: waveform envelope (times, env_min, env_max),
+        spectrum (freqs, dB per channel), levels and the spectrogram, all in
+        time order. `channels` limits the waveform and spectrum to a subset.
+        """
+        channels = slice(None) if channels is None else channels
+        order = (self.env_pos + np.arange(WAVEFORM_POINTS)) % WAVEFORM_POINTS
+        return {
+            "times": (np.arange(WAVEFORM_POINTS) - WAVEFORM_POINTS) * self.env_frames / self.sample_rate,
+            "env_min": self.env_min[order][:, channels],
+            "env_max": self.env_max[order][:, channels],
+            "freqs": self.spectrum_freqs,
+            "spectrum_db": self._reduce_bins(self._power_db(self.recent(self.n_fft)[:, channels]), SPECTRUM_POINTS),
+            "rms_db": self.rms_db.copy(),
+            "peak_db": self.peak_db.copy(),
+            "hold_db": self.hold_db.copy(),
+            "spectrogram": np.roll(self.spectrogram, -self.column_pos, axis=1),
+        }
+
+
+def open_source(kind, target=None, sample_rate=None, channels=None, dtype="int16",
+                block_frames=BLOCK_FRAMES, speed=1.0, loop=False, device=None):
+    """Creates a source by name: "soundcard", "file" (target = path) or "pipe" (target = path or "-")."""
+    if kind == "soundcard":
+        return SoundCardSource(device=device, sample_rate=sample_rate, channels=channels, block_frames=block_frames)
+    if kind == "file":
+        return FileSource(target, block_frames=block_frames, speed=speed, loop=loop)
+    if kind == "pipe":
+        if not sample_rate or not channels:
+            raise ValueError("a pipe source needs --rate and --channels")
+        stream = sys.stdin.buffer if target in (None, "-") else open(target, "rb")
+        return PipeSource(stream, sample_rate, channels, dtype=dtype, block_frames=block_frames, speed=speed)
+    raise ValueError(f"unknown source {kind}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the live analysis pipeline without the GUI and report its timing.")
+    parser.add_argument("source", choices=["soundcard", "file", "pipe"])
+    parser.add_argument("target", nargs="?", help="file path (file) or pipe path, '-' for stdin (pipe)")
+    parser.add_argument("--rate", type=int, default=None, help="sample rate (pipe / sound card)")
+    parser.add_argument("--channels", type=int, default=None, help="channel count (pipe / sound card)")
+    parser.add_argument("--dtype", default="int16", choices=list(PCM_DTYPES), help="PCM sample type of a pipe")
+    parser.add_argument("--device", default=None, help="sound card device name or index")
+    parser.add_argument("--block", type=int, default=BLOCK_FRAMES, help="frames per block")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed relative to real time")
+    parser.add_argument("--seconds", type=float, default=10.0, help="how long to run")
+    parser.add_argument("--fps", type=float, default=25.0, help="display updates per second")
+    parser.add_argument("--render", action="store_true", help="also draw the live figure (Agg) every update")
+    args = parser.parse_args(argv)
+
+    device = int(args.device) if args.device is not None and args.device.isdigit() else args.device
+    source = open_source(args.source, args.target, sample_rate=args.rate, channels=args.channels,
+                         dtype=args.dtype, block_frames=args.block, speed=args.speed, loop=True, device=device)
+    analyzer = LiveAnalyzer(source.sample_rate, source.channels)
+    live_plots = canvas = None
+    if args.render:
+        import matplotlib
+        matplotlib.use("Agg")
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        import plots
+        figure = Figure(figsize=(6, 4), dpi=100)
+        canvas = FigureCanvasAgg(figure)
+        live_plots = plots.LivePlots(figure, analyzer)
+        live_plots.attach(canvas)
+
+    print(f"{source.name}: {source.sample_rate} Hz, {source.channels} channels, {source.block_frames}-frame blocks")
+    latencies = []
+    busy = 0.0
+    source.start()
+    started = time.perf_counter()
+    try:
+        while time.perf_counter() - started < args.seconds and not source.exhausted:
+            tick = time.perf_counter()
+            for capture_time, block in source.read_available():
+                analyzer.process(capture_time, block)
+            if analyzer.latest_capture_time is not None:
+                snapshot = analyzer.snapshot(channels=live_plots.channels if live_plots else None)
+                if live_plots is not None:
+                    live_plots.update(snapshot)
+                    live_plots.refresh()
+                latencies.append(time.perf_counter() - analyzer.latest_capture_time)
+            busy += time.perf_counter() - tick
+            time.sleep(max(0.0, 1.0 / args.fps - (time.perf_counter() - tick)))
+    finally:
+        source.stop()
+    elapsed = time.perf_counter() - started
+    if source.error:
+        print(f"Source error: {source.error}")
+    lat = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    print(f"Processed {analyzer.total_frames / source.sample_rate:.1f} sec of audio in {elapsed:.1f} sec, "
+          f"{len(latencies)} display updates, load {busy / elapsed * 100:.0f}%")
+    print(f"Blocks: {source.total_blocks}, dropped: {source.dropped_blocks}")
+    print(f"Latency (ms): median {np.median(lat):.1f}, p95 {np.percentile(lat, 95):.1f}, max {lat.max():.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
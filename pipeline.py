@@ -0,0 +1,335 @@
+"""
+Memoized analysis pipeline shared by the GUI, the headless export and the
+analysis service.
+
+Every stage (decode, channel select / downmix, silence removal, resample,
+STFT, dB, DFT spectrum, mel / constant-Q bands, envelopes, statistics,
+activity) is a function registered with @stage. A stage takes the graph and
+keyword parameters and gets its inputs with graph.get(<stage>, ...), so the
+graph of stages is declared by those calls. AnalysisGraph memoizes every node
+by (stage, parameters): asking for several views computes each shared stage
+once, e.g. the Spectrogram, 3D Spectrogram and Mel views share one STFT.
+
+The cache is an LRU bounded by MAX_CACHE_BYTES (arrays that are views of the
+decoded samples cost nothing); the decoded signal itself is never evicted.
+A result larger than the whole budget is not cached at all, so the heavy
+stages bound their output size (the STFT keeps at most STFT_MAX_FRAMES frames).
+graph.timings() reports, per node, how often it was computed or served from
+the cache, its own compute time (without the stages it called) and whether it
+was too large to cache.
+"""
+import time
+import collections
+import numpy as np
+from scipy.signal import spectrogram
+import audio_io
+import dsp
+import educational_dft
+import plots
+
+MAX_CACHE_BYTES = 1 << 30
+STFT_NPERSEG = 2048
+STFT_MAX_FRAMES = 4000   # больше столбцов ни один вид всё равно не покажет
+MEL_BANDS = 128
+DB_FLOOR = 1e-10
+
+STAGES = {}
+
+
+def stage(name):
+    """Registers `func(graph, **params)` as the pipeline stage `name`."""
+    def register(func):
+        STAGES[name] = func
+        return func
+    return register
+
+
+class AnalysisGraph:
+    """Memoized stage outputs for one decoded signal (see the module docstring)."""
+
+    DECODE_KEY = ("decode", ())
+
+    def __init__(self, data, sample_rate, max_bytes=MAX_CACHE_BYTES, decode_seconds=0.0):
+        self.data = data
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self._cache = collections.OrderedDict()   # key -> (value, nbytes)
+        self._bytes = 0
+        self._stats = {self.DECODE_KEY: {"computed": 1, "hits": 0, "seconds": decode_seconds}}
+        self._cache[self.DECODE_KEY] = ((data, sample_rate), 0)
+        self._child_seconds = []   # стек: время вложенных стадий текущего вызова
+        self._oversize = {}        # key -> nbytes для результатов больше всего бюджета
+
+    @classmethod
+    def from_file(cls, file_path, **kwargs):
+        start = time.perf_counter()
+        data, sample_rate, _ = audio_io.load_audio(file_path)
+        return cls(data, sample_rate, decode_seconds=time.perf_counter() - start, **kwargs)
+
+    @property
+    def n_channels(self):
+        return 1 if self.data.ndim == 1 else self.data.shape[1]
+
+    def get(self, name, **params):
+        """Output of stage `name` for `params`, computed at most once while cached."""
+        key = (name, tuple(sorted(params.items())))
+        stats = self._stats.setdefault(key, {"computed": 0, "hits": 0, "seconds": 0.0})
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            stats["hits"] += 1
+            return self._cache[key][0]
+        self._child_seconds.append(0.0)
+        start = time.perf_counter()
+        try:
+            value = STAGES[name](self, **params)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._child_seconds.pop()
+            if self._child_seconds:
+                self._child_seconds[-1] += elapsed
+        stats["computed"] += 1
+        stats["seconds"] += elapsed - children
+        self._store(key, value)
+        return value
+
+    def seed(self, name, value, **params):
+        """Stores a result computed elsewhere (e.g. by the decoder process) as the node `name`."""
+        key = (name, tuple(sorted(params.items())))
+        self._stats.setdefault(key, {"computed": 0, "hits": 0, "seconds": 0.0})
+        self._store(key, value)
+
+    def _nbytes(self, value):
+        if isinstance(value, np.ndarray):
+            # Представления исходного сигнала память не занимают
+            return 0 if np.may_share_memory(value, self.data) else value.nbytes
+        if isinstance(value, (tuple, list)):
+            return sum(self._nbytes(v) for v in value)
+        if isinstance(value, dict):
+            return sum(self._nbytes(v) for v in value.values())
+        return 0
+
+    def _store(self, key, value):
+        nbytes = self._nbytes(value)
+        if nbytes > self.max_bytes:
+            self._oversize[key] = nbytes   # больше всего бюджета — не кэшируем
+            return
+        self._cache[key] = (value, nbytes)
+        self._bytes += nbytes
+        while self._bytes > self.max_bytes:
+            for old_key in self._cache:
+                if old_key != self.DECODE_KEY:
+                    break
+            self._bytes -= self._cache.pop(old_key)[1]
+
+    def timings(self):
+        """Per-node rows (stage, params, computed, hits, seconds), slowest first."""
+        rows = [{"stage": key[0], "params": dict(key[1]), "not_cached_bytes": self._oversize.get(key, 0), **stats}
+                for key, stats in self._stats.items()]
+        return sorted(rows, key=lambda row: -row["seconds"])
+
+    def format_timings(self, limit=20):
+        lines = [f"{'stage':<18}{'computed':>9}{'hits':>6}{'ms':>10}  params"]
+        for row in self.timings()[:limit]:
+            params = ", ".join(f"{k}={_short(v)}" for k, v in row["params"].items())
+            if row["not_cached_bytes"]:
+                params += f"  [not cached: {row['not_cached_bytes'] / 1e6:.0f} MB > cache limit]"
+            lines.append(f"{row['stage']:<18}{row['computed']:>9}{row['hits']:>6}"
+                         f"{row['seconds'] * 1000:>10.1f}  {params}")
+        total = sum(row["seconds"] for row in self.timings())
+        lines.append(f"total {total * 1000:.1f} ms, cached {self._bytes / 1e6:.1f} MB")
+        return "\n".join(lines)
+
+
+def _short(value):
+    if isinstance(value, tuple) and len(value) > 4:
+        return f"({value[0]}..{value[-1]}, {len(value)} items)"
+    return value
+
+
+# ----------------- Стадии -----------------
+
+@stage("activity")
+def _activity(graph):
+    data, sample_rate = graph.get("decode")
+    return dsp.ActivityIndex(data, sample_rate)
+
+
+@stage("statistics")
+def _statistics(graph):
+    data, _ = graph.get("decode")
+    return dsp.compute_statistics(data)
+
+
+@stage("select")
+def _select(graph, channels=None):
+    """
+    (frames (n, k), labels). `channels` is a tuple of 0-based indices or None
+    for all channels.
+    """
+    data, _ = graph.get("decode")
+    if data.ndim == 1:
+        return data[:, None], ["Mono"]
+    if channels is None or tuple(channels) == tuple(range(data.shape[1])):
+        return data, [f"Channel {i + 1}" for i in range(data.shape[1])]
+    return data[:, list(channels)], [f"Channel {i + 1}" for i in channels]
+
+
+@stage("silence")
+def _silence(graph, channels=None, skip_silence=False):
+    frames, _ = graph.get("select", channels=channels)
+    if not skip_silence:
+        return frames
+    return graph.get("activity").collapse(frames)
+
+
+@stage("resample")
+def _resample(graph, channels=None, skip_silence=False, decimation=1):
+    frames = graph.get("silence", channels=channels, skip_silence=skip_silence)
+    return dsp.decimate(frames, graph.sample_rate, decimation)
+
+
+@stage("stft")
+def _stft(graph, nperseg=STFT_NPERSEG, **signal):
+    """
+    Power STFT of all selected channels: (f, t, Sxx) with Sxx shaped
+    (channels, freqs, times) and at most STFT_MAX_FRAMES times.
+    """
+    frames, sample_rate = graph.get("resample", **signal)
+    nperseg = min(nperseg, len(frames))
+    # Как в dsp.cqt_spectrogram: на длинных сигналах шаг растёт, чтобы кадров было
+    # не больше STFT_MAX_FRAMES и результат помещался в кэш (иначе он считается заново
+    # для каждого вида). Шаг может превысить окно — тогда часть сэмплов пропускается
+    hop = max(nperseg // 2, int(np.ceil(max(len(frames) - nperseg, 0) / STFT_MAX_FRAMES)))
+    f, t, Sxx = spectrogram(frames, sample_rate, window='hann', nperseg=nperseg,
+                            noverlap=nperseg - hop, detrend=False, axis=0)
+    return f, t, np.moveaxis(Sxx, 1, 0)
+
+
+@stage("stft_db")
+def _stft_db(graph, **params):
+    f, t, Sxx = graph.get("stft", **params)
+    return f, t, 10 * np.log10(Sxx + DB_FLOOR)
+
+
+@stage("spectrum")
+def _spectrum(graph, engine="numpy", **signal):
+    """DFT magnitude of the whole (resampled) signal: (freqs, magnitude (freqs, channels))."""
+    frames, sample_rate = graph.get("resample", **signal)
+    if engine == "numpy":
+        n = len(frames)
+        magnitude = np.abs(np.fft.rfft(frames, axis=0))
+    else:
+        # Ручные движки: дополняем нулями до удобной для них длины
+        n = educational_dft.padded_length(len(frames), engine)
+        padded = np.zeros((frames.shape[1], n))
+        padded[:, :len(frames)] = frames.T
+        magnitude = np.abs(educational_dft.ENGINES[engine](padded)[:, :n // 2 + 1]).T
+    half = n // 2
+    return np.fft.rfftfreq(n, d=1 / sample_rate)[:half], magnitude[:half]
+
+
+@stage("mel")
+def _mel(graph, fmax=None, **signal):
+    """Mel bands of the shared STFT power: (centers, t, S) with S shaped (channels, n_mels, times)."""
+    frames, sample_rate = graph.get("resample", **signal)
+    _, t, Sxx = graph.get("stft", **signal)
+    # Банк фильтров строим под тот же размер окна, что и у узла stft
+    filterbank, centers = dsp.mel_filterbank(sample_rate, min(STFT_NPERSEG, len(frames)), MEL_BANDS, fmax)
+    return centers, t, np.stack([filterbank @ power for power in Sxx.astype(np.float32, copy=False)])
+
+
+@stage("cqt")
+def _cqt(graph, fmax=None, **signal):
+    frames, sample_rate = graph.get("resample", **signal)
+    return dsp.cqt_spectrogram(frames, sample_rate, fmax=fmax)
+
+
+@stage("envelope")
+def _envelope(graph, points, channels=None):
+    frames, _ = graph.get("select", channels=channels)
+    return dsp.peak_envelope(frames, graph.sample_rate, points=points)
+
+
+@stage("average_spectrum")
+def _average_spectrum(graph, points):
+    data, sample_rate = graph.get("decode")
+    return dsp.average_spectrum(data, sample_rate, points=points)
+
+
+# ----------------- Виды -----------------
+
+def visible_channels(graph, channels=None):
+    """Normalized channel parameter: None for mono, else a tuple (first page by default)."""
+    if graph.n_channels == 1:
+        return None
+    if channels is None:
+        channels = range(min(graph.n_channels, plots.MAX_VISIBLE_CHANNELS))
+    return tuple(channels)
+
+
+def _render_waveform(graph, figure, channels, signal, max_freq, engine):
+    frames, labels = graph.get("select", channels=channels)
+    n = len(frames)
+    if n > 2 * plots.WAVEFORM_MAX_POINTS:
+        times, env_min, env_max = graph.get("envelope", points=plots.WAVEFORM_MAX_POINTS, channels=channels)
+        plots.plot_waveform(figure, times, labels, envelope=(env_min, env_max))
+    else:
+        plots.plot_waveform(figure, np.linspace(0, n / graph.sample_rate, num=n), labels, samples=frames)
+
+
+def _render_spectrogram(graph, figure, channels, signal, max_freq, engine):
+    labels = graph.get("select", channels=channels)[1]
+    frames, sample_rate = graph.get("resample", **signal)
+    f, _, Sxx_db = graph.get("stft_db", **signal)
+    plots.plot_spectrogram(figure, f, Sxx_db, labels, len(frames) / sample_rate, max_freq)
+
+
+def _render_3d(graph, figure, channels, signal, max_freq, engine):
+    labels = graph.get("select", channels=channels)[1]
+    f, t, Sxx_db = graph.get("stft_db", **signal)
+    plots.plot_3d_spectrogram(figure, f, t, Sxx_db, labels, max_freq)
+
+
+def _render_dft(graph, figure, channels, signal, max_freq, engine):
+    labels = graph.get("select", channels=channels)[1]
+    freqs, magnitude = graph.get("spectrum", engine=engine, **signal)
+    plots.plot_dft(figure, freqs, magnitude, labels, max_freq)
+
+
+def _render_mel(graph, figure, channels, signal, max_freq, engine):
+    labels = graph.get("select", channels=channels)[1]
+    centers, times, S = graph.get("mel", fmax=max_freq, **signal)
+    plots.plot_mel_spectrogram(figure, centers, times, S, labels)
+
+
+def _render_cqt(graph, figure, channels, signal, max_freq, engine):
+    labels = graph.get("select", channels=channels)[1]
+    centers, times, C = graph.get("cqt", fmax=max_freq, **signal)
+    plots.plot_cqt_spectrogram(figure, centers, times, C, labels)
+
+
+# Имя вида -> функция рисования (GUI, headless-экспорт)
+VIEWS = {
+    "waveform": _render_waveform,
+    "spectrogram": _render_spectrogram,
+    "dft": _render_dft,
+    "3d": _render_3d,
+    "mel": _render_mel,
+    "cqt": _render_cqt,
+}
+
+
+def render_view(graph, view, figure, max_freq=None, skip_silence=False, channels=None, engine="numpy"):
+    """
+    Draws `view` for the graph's signal on `figure`. The spectral views see the
+    signal decimated to `max_freq` and, with `skip_silence`, without its silent
+    stretches; the waveform always shows the full-rate signal.
+    """
+    channels = visible_channels(graph, channels)
+    # Параметр — коэффициент децимации, а не max_freq: частоты с одинаковым коэффициентом делят кэш
+    signal = {
+        "channels": channels,
+        "skip_silence": bool(skip_silence),
+        "decimation": dsp.decimation_factor(graph.sample_rate, max_freq),
+    }
+    VIEWS[view](graph, figure, channels, signal, max_freq, engine)
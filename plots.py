@@ -0,0 +1,291 @@
+import numpy as np
+
+# Функции рисования не зависят от backend'а: их вызывает и GUI (TkAgg),
+# и headless-экспорт (Agg). Каждая получает уже созданную Figure и уже
+# посчитанные промежуточные результаты (см. pipeline.py) — сами они ничего не считают.
+#
+# Многоканальные файлы: рисуются только выбранные каналы (по умолчанию
+# первые MAX_VISIBLE_CHANNELS), по одной оси на канал.
+
+MAX_VISIBLE_CHANNELS = 8
+WAVEFORM_MAX_POINTS = 10000  # длиннее — рисуем огибающую min/max вместо всех сэмплов
+SURFACE_MAX_POINTS = 200     # точек по каждой оси 3D-поверхности
+CHANNEL_COLORS = ['blue', 'red', 'green', 'orange', 'purple', 'brown']
+
+
+def parse_channel_list(text, n_channels):
+    """
+    Parses a channel selection like "1-4, 9, 12" (1-based) into a sorted list
+    of 0-based indices. Raises ValueError for bad input.
+    """
+    selected = set()
+    for part in text.replace(" ", "").split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = (int(v) for v in part.split("-", 1))
+        else:
+            first = last = int(part)
+        if first < 1 or last > n_channels or first > last:
+            raise ValueError(f"channel range {part} is outside 1-{n_channels}")
+        selected.update(range(first - 1, last))
+    if not selected:
+        raise ValueError("no channels selected")
+    return sorted(selected)
+
+
+def plot_waveform(figure, times, labels, samples=None, envelope=None):
+    """Samples (n, channels) or, for long signals, a min/max envelope (env_min, env_max)."""
+    figure.clear()
+    colors = ['blue', 'red'] if len(labels) == 2 else CHANNEL_COLORS
+    for i, label in enumerate(labels):
+        ax = figure.add_subplot(len(labels), 1, i + 1)
+        color = colors[i % len(colors)]
+        if envelope is not None:
+            ax.fill_between(times, envelope[0][:, i], envelope[1][:, i], color=color, linewidth=0.5)
+        else:
+            ax.plot(times, samples[:, i], color=color)
+        ax.set_title(f"Waveform ({label})")
+        ax.set_ylabel("Amplitude")
+        ax.grid()
+        ax.set_xlabel("Time (sec)")
+
+
+def plot_spectrogram(figure, f, Sxx_db, labels, duration, max_freq=None):
+    """Sxx_db has shape (channels, freqs, times)."""
+    figure.clear()
+    for i, label in enumerate(labels):
+        ax = figure.add_subplot(len(labels), 1, i + 1)
+        ax.imshow(Sxx_db[i], aspect='auto', origin='lower', cmap='inferno',
+                  extent=[0, duration, f[0], f[-1]])
+        ax.set_title(f"Spectrogram ({label})")
+        ax.set_ylabel("Frequency (Hz)")
+        if max_freq:
+            ax.set_ylim(0, max_freq)
+    ax.set_xlabel("Time (sec)")
+
+
+def plot_dft(figure, freqs, spectrum, labels, max_freq=None):
+    """spectrum has shape (freqs, channels)."""
+    figure.clear()
+    for i, label in enumerate(labels):
+        ax = figure.add_subplot(len(labels), 1, i + 1)
+        ax.plot(freqs, spectrum[:, i], color='purple')
+        if max_freq:
+            ax.set_xlim(0, max_freq)
+        ax.set_title(f"DFT Spectrum ({label})")
+        ax.set_ylabel("Amplitude")
+        ax.grid()
+    ax.set_xlabel("Frequency (Hz)")
+
+
+def plot_3d_spectrogram(figure, f, t, Sxx_db, labels, max_freq=None):
+    from mpl_toolkits.mplot3d import Axes3D  # noqa
+    figure.clear()
+    if max_freq:
+        f, Sxx_db = f[f <= max_freq], Sxx_db[:, f <= max_freq]
+    # plot_surface всё равно берёт ~50x50 точек — прореживаем заранее, чтобы не строить огромную сетку
+    f_step, t_step = max(1, len(f) // SURFACE_MAX_POINTS), max(1, len(t) // SURFACE_MAX_POINTS)
+    f, t, Sxx_db = f[::f_step], t[::t_step], Sxx_db[:, ::f_step, ::t_step]
+    T, F = np.meshgrid(t, f)
+    # Сетка вместо одной строки: 1x2 для стерео, 2x2 / 2x3 / 3x3 для большего числа каналов
+    cols = len(labels) if len(labels) <= 2 else int(np.ceil(np.sqrt(len(labels))))
+    rows = int(np.ceil(len(labels) / cols))
+    for i, label in enumerate(labels):
+        ax = figure.add_subplot(rows, cols, i + 1, projection='3d')
+        ax.plot_surface(T, F, Sxx_db[i], cmap="jet")
+        ax.set_title(f"3D Spectrogram ({label})")
+        ax.set_ylabel("Frequency (Hz)")
+        ax.set_zlabel("Magnitude (dB)")
+    ax.set_xlabel("Time (sec)")
+
+
+def plot_dft_benchmark(figure, results):
+    """Runtime vs N (log-log) and the error relative to np.fft for each DFT engine."""
+    figure.clear()
+    names = {"numpy": "np.fft.fft", "matrix": "Matrix DFT (4-step)", "radix2": "Radix-2 FFT"}
+    colors = {"numpy": "blue", "matrix": "purple", "radix2": "red"}
+    ax = figure.add_subplot(2, 1, 1)
+    for engine, name in names.items():
+        rows = [r for r in results if engine in r["time"]]
+        ax.loglog([r["n"] for r in rows], [r["time"][engine] * 1000 for r in rows],
+                  marker='o', color=colors[engine], label=name)
+    ax.set_title("DFT Benchmark")
+    ax.set_ylabel("Time (ms)")
+    ax.legend()
+    ax.grid(which="both")
+    ax = figure.add_subplot(2, 1, 2)
+    for engine in ("matrix", "radix2"):
+        rows = [r for r in results if engine in r["error"]]
+        ax.loglog([r["n"] for r in rows], [max(r["error"][engine], 1e-18) for r in rows],
+                  marker='o', color=colors[engine], label=names[engine])
+    ax.set_ylabel("Max error vs np.fft")
+    ax.set_xlabel("Signal length N")
+    ax.legend()
+    ax.grid(which="both")
+
+
+def plot_alignment(figure, result, labels):
+    """
+    Comparison view of alignment.align(..., with_envelopes=True): both envelopes
+    on the reference time line, the other file shifted by the found offset.
+    """
+    figure.clear()
+    offset = result["offset_sec"]
+    shared = None
+    for i, ((rate, env_min, env_max), label) in enumerate(zip(result["envelopes"], labels)):
+        ax = figure.add_subplot(2, 1, i + 1, sharex=shared)
+        shared = shared or ax
+        step = max(1, len(env_min) // WAVEFORM_MAX_POINTS)
+        edges = np.arange(0, len(env_min), step)
+        times = edges / rate + (offset if i == 1 else 0.0)
+        ax.fill_between(times, np.minimum.reduceat(env_min, edges), np.maximum.reduceat(env_max, edges),
+                        color=['blue', 'red'][i], linewidth=0.5)
+        ax.axvline(max(offset, 0.0), color='black', linestyle='--', linewidth=0.8)
+        ax.set_ylabel(label)
+        ax.grid()
+    shared.set_title(f"Aligned: other file starts at {offset:+.3f} sec (confidence {result['confidence']:.2f})")
+    ax.set_xlabel("Reference time (sec)")
+
+
+def _draw_band_image(ax, centers, times, S, title):
+    """Draws a band spectrogram (mel / constant-Q) in dB with Hz labels on the band axis."""
+    ax.imshow(10 * np.log10(S + 1e-10), aspect='auto', origin='lower', cmap='inferno',
+              extent=[times[0], times[-1], 0, len(centers)])
+    ticks = np.linspace(0, len(centers) - 1, num=min(8, len(centers))).astype(int)
+    ax.set_yticks(ticks + 0.5)
+    ax.set_yticklabels([f"{centers[i]:.0f}" for i in ticks])
+    ax.set_title(title)
+    ax.set_ylabel("Frequency (Hz)")
+
+
+def plot_mel_spectrogram(figure, centers, times, S, labels):
+    """S has shape (channels, n_mels, frames)."""
+    figure.clear()
+    for i, label in enumerate(labels):
+        ax = figure.add_subplot(len(labels), 1, i + 1)
+        _draw_band_image(ax, centers, times, S[i], f"Mel Spectrogram ({label})")
+    ax.set_xlabel("Time (sec)")
+
+
+def plot_cqt_spectrogram(figure, centers, times, C, labels):
+    """C (magnitudes) has shape (channels, bins, frames)."""
+    figure.clear()
+    for i, label in enumerate(labels):
+        ax = figure.add_subplot(len(labels), 1, i + 1)
+        _draw_band_image(ax, centers, times, C[i] ** 2, f"Constant-Q Spectrogram ({label})")
+    ax.set_xlabel("Time (sec)")
+
+
+class LivePlots:
+    """
+    Live view (see live_input.py): waveform envelope, spectrogram, spectrum and
+    level meters. The axes and artists are created once; update() only swaps
+    their data, and refresh() redraws just those artists over a cached
+    background (blitting) instead of the whole figure with its axes and text.
+    """
+
+    METER_FLOOR_DB = -90.0
+
+    def __init__(self, figure, analyzer):
+        figure.clear()
+        self.figure = figure
+        self.analyzer = analyzer
+        n_channels = analyzer.channels
+        # Осциллограмма и спектр — первые MAX_VISIBLE_CHANNELS каналов, индикаторы — все
+        self.channels = list(range(min(n_channels, MAX_VISIBLE_CHANNELS)))
+        colors = ['blue', 'red'] if len(self.channels) == 2 else CHANNEL_COLORS
+        self.colors = [colors[i % len(colors)] for i in self.channels]
+        nyquist = analyzer.sample_rate / 2
+        grid = figure.add_gridspec(3, 2, width_ratios=[5, 1])
+
+        self.wave_ax = figure.add_subplot(grid[0, 0])
+        self.wave_fills = [self.wave_ax.fill_between([0, 1], [0, 0], [0, 0], color=c, linewidth=0.5, alpha=0.7, antialiased=False,
+                                                     animated=True)
+                           for c in self.colors]
+        self.wave_ax.set_xlim(-analyzer.history_sec, 0)
+        self.wave_ax.set_ylim(-1, 1)
+        self.wave_ax.set_title("Live Waveform")
+        self.wave_ax.set_ylabel("Amplitude")
+
+        self.spec_ax = figure.add_subplot(grid[1, 0])
+        self.spec_image = self.spec_ax.imshow(
+            analyzer.spectrogram, aspect='auto', origin='lower', cmap='inferno', vmin=-100, vmax=0,
+            extent=[-analyzer.spectrogram_sec, 0, 0, nyquist], animated=True)
+        self.spec_ax.set_title("Live Spectrogram")
+        self.spec_ax.set_ylabel("Frequency (Hz)")
+        self.spec_ax.set_xlabel("Time (sec)")
+
+        self.fft_ax = figure.add_subplot(grid[2, 0])
+        freqs = analyzer.spectrum_freqs
+        self.fft_lines = [self.fft_ax.plot(freqs, np.full(len(freqs), -120.0), color=c, linewidth=0.8, antialiased=False,
+                                              animated=True)[0]
+                          for c in self.colors]
+        self.fft_ax.set_xlim(0, nyquist)
+        self.fft_ax.set_ylim(-120, 0)
+        self.fft_ax.set_title("Live Spectrum")
+        self.fft_ax.set_ylabel("dB")
+        self.fft_ax.set_xlabel("Frequency (Hz)")
+        self.fft_ax.grid()
+
+        self.meter_ax = figure.add_subplot(grid[:, 1])
+        positions = np.arange(n_channels)
+        self.meter_bars = self.meter_ax.barh(positions, np.zeros(n_channels), left=self.METER_FLOOR_DB,
+                                             color='green', height=0.8, animated=True)
+        self.hold_marks, = self.meter_ax.plot(np.full(n_channels, self.METER_FLOOR_DB), positions,
+                                              linestyle='none', marker='|', markersize=10, color='red',
+                                              animated=True)
+        self.meter_ax.set_xlim(self.METER_FLOOR_DB, 0)
+        self.meter_ax.set_ylim(n_channels - 0.5, -0.5)
+        self.meter_ax.set_yticks(positions)
+        self.meter_ax.set_yticklabels([str(i + 1) for i in positions])
+        self.meter_ax.set_title("Level (dB)")
+        figure.tight_layout()
+        self.artists = [*self.wave_fills, self.spec_image, *self.fft_lines, *self.meter_bars, self.hold_marks]
+        self.canvas = None
+        self._background = None
+        self._draw_cid = None
+
+    def attach(self, canvas):
+        """Starts drawing on `canvas`; the background is re-captured on every full draw (e.g. resize)."""
+        self.canvas = canvas
+        self._draw_cid = canvas.mpl_connect("draw_event", self._on_draw)
+        canvas.draw()
+
+    def detach(self):
+        if self.canvas is not None:
+            self.canvas.mpl_disconnect(self._draw_cid)
+            self.canvas = None
+            self._background = None
+
+    def _on_draw(self, event):
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            artist.axes.draw_artist(artist)
+
+    def refresh(self):
+        """Redraws only the live artists over the cached background."""
+        if self._background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self._background)
+        self._draw_artists()
+        self.canvas.blit(self.figure.bbox)
+
+    def update(self, snapshot):
+        times = snapshot["times"]
+        for i, fill in enumerate(self.wave_fills):
+            upper = np.column_stack([times, snapshot["env_max"][:, i]])
+            lower = np.column_stack([times[::-1], snapshot["env_min"][::-1, i]])
+            fill.set_verts([np.vstack([upper, lower])])
+        self.spec_image.set_data(snapshot["spectrogram"])
+        for i, line in enumerate(self.fft_lines):
+            line.set_ydata(snapshot["spectrum_db"][:, i])
+        rms_db = np.maximum(snapshot["rms_db"], self.METER_FLOOR_DB)
+        for bar, level, peak in zip(self.meter_bars, rms_db, snapshot["peak_db"]):
+            bar.set_width(level - self.METER_FLOOR_DB)
+            bar.set_color('red' if peak >= -0.1 else 'orange' if peak > -6 else 'green')
+        self.hold_marks.set_xdata(np.maximum(snapshot["hold_db"], self.METER_FLOOR_DB))
@@ -1,23 +1,31 @@
 import os
-import wave
 import numpy as np
 import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
+from tkinter import filedialog, messagebox, ttk, simpledialog
 import matplotlib
 matplotlib.use("TkAgg")
 from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-import soundfile as sf
-from scipy.io import wavfile
 import platform
 import sys
-from scipy.signal import spectrogram
-from pydub import AudioSegment
+import time
+import multiprocessing
 from PIL import Image, ImageTk
 import simpleaudio as sa
+import alignment
+import audio_io
+import decoder_worker
+import educational_dft
+import fingerprint
+import live_input
+import pipeline
+import plots
 
 np.seterr(divide='ignore')  # подавляем предупреждения деления на ноль
 
+DECODE_POLL_MS = 50  # как часто GUI забирает сообщения от процесса декодирования
+LIVE_POLL_MS = 40    # период обновления live-графиков (~25 кадров/с)
+
 class SoundAnalyzer:
     def __init__(self, root):
         self.root = root
@@ -45,6 +53,28 @@ class SoundAnalyzer:
         self.data = None
         self.sample_rate = None
 
+        # Максимальная интересующая частота (None — весь диапазон до Найквиста)
+        self.max_freq = None
+        # Граф анализа загруженного файла: кэширует общие стадии (децимация, STFT...) всех видов
+        self.graph = None
+
+        # Индекс активности (строится при загрузке) и режим пропуска тишины
+        self.activity = None
+        self.skip_silence = tk.BooleanVar(value=False)
+
+        # Многоканальные файлы: выбранные каналы (None — все) и первый видимый из них
+        self.channel_subset = None
+        self.channel_offset = 0
+        self.channel_scrollbar = None
+        # Последний построенный график — его перерисовываем при прокрутке каналов
+        self.current_plot = None
+
+        # Движок для DFT Spectrum: "numpy", "matrix" или "radix2" (см. educational_dft.py)
+        self.dft_engine = tk.StringVar(value="numpy")
+
+        # Папка индекса отпечатков (Tools → Find Duplicates), запоминается на сессию
+        self.fingerprint_index_dir = None
+
         # Переменные для анимации загрузки
         self.loading_dialog = None
         self.loading_frames = []
@@ -52,9 +82,18 @@ class SoundAnalyzer:
 
         # Флаг для режима real-time
         self.realtime_mode = False
+        # Live-анализ: источник сэмплов, состояние анализа и графики (см. live_input.py)
+        self.live_source = None
+        self.live_analyzer = None
+        self.live_plots = None
+        self.live_poll_handle = None
+
+        # Декодирование в отдельном процессе (decoder_worker.DecodeJob)
+        self.decode_job = None
+        self.decode_file_path = None
+        self.decode_poll_handle = None
 
         # Переменные для воспроизведения
-        self.audio_segment = None  # хранит AudioSegment для всех форматов
         self.play_obj = None  # объект воспроизведения из simpleaudio
         self.is_playing = False
         self.current_frame = 0  # текущая позиция в сэмплах (индекс)
@@ -73,6 +112,24 @@ class SoundAnalyzer:
         file_menu.add_command(label="Exit", command=self.root.quit)
         menubar.add_cascade(label="File", menu=file_menu)
 
+        settings_menu = tk.Menu(menubar, tearoff=0)
+        settings_menu.add_command(label="Max Frequency of Interest...", command=self.ask_max_freq)
+        settings_menu.add_checkbutton(label="Skip Silence in Spectral Views", variable=self.skip_silence)
+        settings_menu.add_command(label="Select Channels...", command=self.ask_channels)
+        dft_menu = tk.Menu(settings_menu, tearoff=0)
+        dft_menu.add_radiobutton(label="NumPy FFT", variable=self.dft_engine, value="numpy")
+        dft_menu.add_radiobutton(label="Matrix DFT (manual)", variable=self.dft_engine, value="matrix")
+        dft_menu.add_radiobutton(label="Radix-2 FFT (manual)", variable=self.dft_engine, value="radix2")
+        settings_menu.add_cascade(label="DFT Engine", menu=dft_menu)
+        menubar.add_cascade(label="Settings", menu=settings_menu)
+
+        tools_menu = tk.Menu(menubar, tearoff=0)
+        tools_menu.add_command(label="FFT vs DFT Benchmark", command=self.show_dft_benchmark)
+        tools_menu.add_command(label="Find Duplicates in Index...", command=self.find_duplicates)
+        tools_menu.add_command(label="Align With File...", command=self.align_with_file)
+        tools_menu.add_command(label="Analysis Pipeline Timings", command=self.show_pipeline_timings)
+        menubar.add_cascade(label="Tools", menu=tools_menu)
+
         help_menu = tk.Menu(menubar, tearoff=0)
         help_menu.add_command(label="About...", command=self.show_about)
         menubar.add_cascade(label="Help", menu=help_menu)
@@ -131,7 +188,11 @@ class SoundAnalyzer:
             "3D Spectrogram": ttk.Button(self.button_frame, text="🌍 Show 3D Spectrogram",
                                          command=self.show_3d_spectrogram, state="disabled", style="Fixed.TButton"),
             "DFT": ttk.Button(self.button_frame, text="📊 Show DFT Spectrum",
-                              command=self.show_dft, state="disabled", style="Fixed.TButton")
+                              command=self.show_dft, state="disabled", style="Fixed.TButton"),
+            "Mel": ttk.Button(self.button_frame, text="🎤 Show Mel Spectrogram",
+                              command=self.show_mel_spectrogram, state="disabled", style="Fixed.TButton"),
+            "CQT": ttk.Button(self.button_frame, text="🎹 Show Constant-Q",
+                              command=self.show_cqt_spectrogram, state="disabled", style="Fixed.TButton")
         }
         for btn in self.buttons.values():
             btn.pack(pady=4, fill="x")
@@ -186,6 +247,14 @@ class SoundAnalyzer:
         self.stop_button = ttk.Button(self.playback_frame, text="■", command=self.on_stop)
         self.stop_button.pack(side="left", padx=5, pady=5)
 
+        # 3) Переход к предыдущему / следующему событию (по индексу активности)
+        self.prev_event_button = ttk.Button(self.playback_frame, text="⏮", width=3,
+                                            command=lambda: self.jump_to_event(-1))
+        self.prev_event_button.pack(side="left", padx=2, pady=5)
+        self.next_event_button = ttk.Button(self.playback_frame, text="⏭", width=3,
+                                            command=lambda: self.jump_to_event(1))
+        self.next_event_button.pack(side="left", padx=2, pady=5)
+
         # Флаг, показывающий, на паузе ли трек
         self.is_paused = False
 
@@ -232,6 +301,8 @@ class SoundAnalyzer:
 
     def on_close(self):
         self.hide_loading_dialog()
+        self.stop_live()
+        self._release_decode()
         self.root.destroy()
         sys.exit(0)
 
@@ -358,6 +429,34 @@ class SoundAnalyzer:
         # Продолжаем цикл
         self.update_handle = self.root.after(100, self.update_scale_position)
 
+    def jump_to_event(self, direction):
+        """
+        Moves the position to the next (direction=1) or previous (direction=-1)
+        non-silent event. Playback continues from there if it was running.
+        """
+        if self.data is None or self.activity is None:
+            return
+        if direction > 0:
+            target = self.activity.next_event(self.current_frame)
+        else:
+            target = self.activity.previous_event(self.current_frame)
+        if target is None:
+            return
+
+        was_playing = self.is_playing
+        if was_playing:
+            self._pause_playback()
+
+        self.current_frame = target
+        total_frames = len(self.data)
+        self.position_var.set((self.current_frame / total_frames) * 100)
+        current_sec = self.current_frame / self.sample_rate
+        self.current_time_label.config(text=self.format_time(current_sec))
+        self.remaining_time_label.config(text="-" + self.format_time(total_frames / self.sample_rate - current_sec))
+
+        if was_playing:
+            self._resume_playback()
+
     def format_time(self, sec):
         """Преобразует число секунд в M:SS."""
         m = int(sec // 60)
@@ -428,12 +527,25 @@ class SoundAnalyzer:
 
     # ==================== Кнопка Real-time ====================
     def toggle_realtime(self):
-        self.show_realtime_info()
+        if self.live_source is not None:
+            self.stop_live()
+        else:
+            self.show_realtime_info()
+
+    def _set_realtime_button(self, on):
+        self.realtime_mode = on
+        if on:
+            self.realtime_button.config(text="Real-time ON")
+            self.style.configure("RealTime.TButton", foreground="green")
+        else:
+            self.realtime_button.config(text="Real-time OFF")
+            self.style.configure("RealTime.TButton", foreground="red")
 
     def show_realtime_info(self):
+        """Asks for the live input source (sound card or a file replayed in real time)."""
         dialog = tk.Toplevel(self.root)
         dialog.withdraw()  # Скрываем окно сразу после создания
-        dialog.title("Real-time Visualization")
+        dialog.title("Real-time Analysis")
 
         # Устанавливаем ту же иконку, если она сохранена
         if hasattr(self, "icon_path"):
@@ -447,7 +559,7 @@ class SoundAnalyzer:
         dialog.grab_set()
 
         win_w = 300
-        win_h = 120
+        win_h = 190
         dialog.geometry(f"{win_w}x{win_h}")
         dialog.update_idletasks()
         screen_w = dialog.winfo_screenwidth()
@@ -459,22 +571,97 @@ class SoundAnalyzer:
         # Теперь показываем окно, когда всё настроено
         dialog.deiconify()
 
-        msg = tk.Label(dialog, text="Real-time visualization will be added\nin future versions!\nStay tuned!❤️.",
-                       font=("Arial", 10))
+        msg = tk.Label(dialog, text="Choose the live input source:", font=("Arial", 10))
         msg.pack(pady=10)
 
-        def on_ok():
+        def on_sound_card():
             dialog.destroy()
-            self.realtime_mode = not self.realtime_mode
-            if self.realtime_mode:
-                self.realtime_button.config(text="Real-time ON")
-                self.style.configure("RealTime.TButton", foreground="green")
-            else:
-                self.realtime_button.config(text="Real-time OFF")
-                self.style.configure("RealTime.TButton", foreground="red")
+            self._open_live_source(lambda: live_input.SoundCardSource())
 
-        ok_button = ttk.Button(dialog, text="OK", command=on_ok)
-        ok_button.pack(pady=5)
+        def on_replay_file():
+            dialog.destroy()
+            file_path = filedialog.askopenfilename(filetypes=[
+                ("Audio Files", "*.wav;*.mp3;*.flac;*.ogg;*.aiff;*.aif;*.m4a"),
+                ("All Files", "*.*")
+            ])
+            if file_path:
+                self._open_live_source(lambda: live_input.FileSource(file_path, loop=True))
+
+        sound_card_button = ttk.Button(dialog, text="🎙 Sound Card Input", command=on_sound_card,
+                                       style="Fixed.TButton")
+        sound_card_button.pack(pady=3)
+        if not live_input.SOUND_CARD_AVAILABLE:
+            sound_card_button.config(state="disabled")
+            tk.Label(dialog, text="(install 'sounddevice' for sound card input)", font=("Arial", 8)).pack()
+        ttk.Button(dialog, text="📂 Replay File in Real Time...", command=on_replay_file,
+                   style="Fixed.TButton").pack(pady=3)
+        ttk.Button(dialog, text="Cancel", command=dialog.destroy).pack(pady=5)
+
+    def _open_live_source(self, create_source):
+        try:
+            source = create_source()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open the live input!\n{str(e)}")
+            return
+        self.start_live(source)
+
+    def start_live(self, source):
+        """Starts live analysis of `source` (see live_input.py); static views stop it."""
+        self.on_stop()
+        self._ensure_figure()
+        self.current_plot = None
+        self.channel_scrollbar.pack_forget()
+        self.live_source = source
+        self.live_analyzer = live_input.LiveAnalyzer(source.sample_rate, source.channels)
+        self.live_plots = plots.LivePlots(self.figure, self.live_analyzer)
+        self.live_plots.attach(self.canvas)
+        source.start()
+        self._set_realtime_button(True)
+        self.live_poll_handle = self.root.after(LIVE_POLL_MS, self._poll_live)
+
+    def _poll_live(self):
+        self.live_poll_handle = None
+        source = self.live_source
+        analyzer = self.live_analyzer
+        if source is None:
+            return
+        # Забираем все накопившиеся блоки, но рисуем один кадр
+        for capture_time, block in source.read_available():
+            analyzer.process(capture_time, block)
+        if analyzer.latest_capture_time is not None:
+            self.live_plots.update(analyzer.snapshot(channels=self.live_plots.channels))
+            self.live_plots.refresh()
+            latency_ms = (time.perf_counter() - analyzer.latest_capture_time) * 1000
+            self.info_label.config(
+                text=(
+                    f"🔴 {source.name}\n"
+                    f"🎵Sample rate: {source.sample_rate} Hz\n"
+                    f"🔊Channels: {source.channels}\n"
+                    f"⌛Analyzed: {analyzer.total_frames / source.sample_rate:.1f} sec\n"
+                    f"📦Blocks: {source.total_blocks}, dropped: {source.dropped_blocks}\n"
+                    f"⏱Latency: {latency_ms:.0f} ms"
+                )
+            )
+        if source.exhausted:
+            error = source.error
+            self.stop_live()
+            if error:
+                messagebox.showerror("Error", f"Live input stopped!\n{error}")
+            return
+        self.live_poll_handle = self.root.after(LIVE_POLL_MS, self._poll_live)
+
+    def stop_live(self):
+        if self.live_poll_handle is not None:
+            self.root.after_cancel(self.live_poll_handle)
+            self.live_poll_handle = None
+        if self.live_source is not None:
+            self.live_source.stop()
+            self.live_source = None
+        if self.live_plots is not None:
+            self.live_plots.detach()
+            self.live_plots = None
+        self.live_analyzer = None
+        self._set_realtime_button(False)
 
     # ----------------- Методы анимации загрузки -----------------
     def show_loading_dialog(self):
@@ -546,8 +733,10 @@ class SoundAnalyzer:
             "WAV, MP3, FLAC, OGG, AIFF, M4A\n\n"
             "Features:\n"
             "  • Display Waveforms\n"
-            "  • Generate Spectrograms (2D & 3D)\n"
+            "  • Generate Spectrograms (2D, 3D, Mel & Constant-Q)\n"
             "  • Compute DFT Spectrum\n"
+            "  • Live input analysis (sound card or file replay)\n"
+            "  • Align two recordings of the same event\n"
             "  • Playback & volume controls\n"
             "  • More cool stuff to be released soon!\n\n"
             "Voroshka software, 2025\n"
@@ -618,110 +807,260 @@ class SoundAnalyzer:
         if file_path:
             self.analyze_audio(file_path)
 
+    def ask_max_freq(self):
+        """
+        Asks for the max frequency of interest. Spectral views then work on a
+        decimated copy of the signal; 0 turns the limit off.
+        """
+        value = simpledialog.askfloat(
+            "Max Frequency",
+            "Max frequency of interest, Hz (0 = full band):",
+            initialvalue=self.max_freq or 0,
+            minvalue=0,
+            parent=self.root
+        )
+        if value is None:
+            return
+        self.max_freq = value if value > 0 else None
+
+    def render_view(self, view):
+        """
+        Draws `view` (a pipeline.VIEWS name) with the current max frequency, silence
+        skipping, visible channels and DFT engine. Shared stages come from self.graph.
+        """
+        pipeline.render_view(self.graph, view, self.figure, max_freq=self.max_freq,
+                             skip_silence=self.skip_silence.get(),
+                             channels=self.get_visible_channels(), engine=self.dft_engine.get())
+
+    def show_pipeline_timings(self):
+        if not self.check_data():
+            return
+        messagebox.showinfo("Analysis Pipeline Timings", self.graph.format_timings())
+
+    def ask_channels(self):
+        """Asks which channels to show, e.g. "1-4, 9"; an empty answer selects all."""
+        if not self.check_data():
+            return
+        if self.data.ndim == 1:
+            messagebox.showinfo("Channels", "This file has a single channel.")
+            return
+        n_channels = self.data.shape[1]
+        current = "" if self.channel_subset is None else ", ".join(str(i + 1) for i in self.channel_subset)
+        text = simpledialog.askstring(
+            "Select Channels",
+            f"Channels to show (1-{n_channels}), e.g. 1-4, 9.\nLeave empty for all:",
+            initialvalue=current,
+            parent=self.root
+        )
+        if text is None:
+            return
+        try:
+            self.channel_subset = plots.parse_channel_list(text, n_channels) if text.strip() else None
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid channel list!\n{str(e)}")
+            return
+        self.channel_offset = 0
+        if self.current_plot is not None:
+            self.current_plot()
+
+    def get_visible_channels(self):
+        """Channel indices currently on screen (one page of the selected channels)."""
+        if self.data is None or self.data.ndim == 1:
+            return None
+        subset = self.channel_subset or list(range(self.data.shape[1]))
+        return subset[self.channel_offset:self.channel_offset + plots.MAX_VISIBLE_CHANNELS]
+
+    def _ensure_figure(self):
+        # Любой статический вид (и новый live-источник) заменяет текущий live-режим
+        self.stop_live()
+        # Если placeholder_label отображается, скрываем его и создаем Figure, Canvas, Toolbar
+        if self.placeholder_label is not None and self.placeholder_label.winfo_ismapped():
+            self.placeholder_label.pack_forget()
+            self.placeholder_label = None
+
+            self.figure = Figure(figsize=(6, 4), dpi=100)
+            self.canvas = FigureCanvasTkAgg(self.figure, master=self.right_frame)
+            self.canvas_widget = self.canvas.get_tk_widget()
+            self.canvas_widget.pack(fill="both", expand=True)
+
+            self.toolbar = NavigationToolbar2Tk(self.canvas, self.right_frame)
+            self.toolbar.update()
+            self.toolbar.pack(side="bottom", fill="x")
+
+            # Вертикальная прокрутка по каналам (показывается только если каналов больше страницы)
+            self.channel_scrollbar = ttk.Scrollbar(self.right_frame, orient="vertical",
+                                                   command=self._on_channel_scroll)
+
+    def _channel_count(self):
+        if self.data is None or self.data.ndim == 1:
+            return 1
+        return len(self.channel_subset or range(self.data.shape[1]))
+
+    def _update_channel_scrollbar(self):
+        total = self._channel_count()
+        page = plots.MAX_VISIBLE_CHANNELS
+        if total <= page:
+            self.channel_scrollbar.pack_forget()
+            return
+        if not self.channel_scrollbar.winfo_ismapped():
+            self.channel_scrollbar.pack(side="right", fill="y", before=self.canvas_widget)
+        self.channel_scrollbar.set(self.channel_offset / total, (self.channel_offset + page) / total)
+
+    def _on_channel_scroll(self, *args):
+        total = self._channel_count()
+        page = plots.MAX_VISIBLE_CHANNELS
+        if args[0] == "moveto":
+            offset = int(round(float(args[1]) * total))
+        elif args[2] == "pages":
+            offset = self.channel_offset + int(args[1]) * page
+        else:
+            offset = self.channel_offset + int(args[1])
+        offset = max(0, min(offset, total - page))
+        if offset != self.channel_offset and self.current_plot is not None:
+            self.channel_offset = offset
+            self.current_plot()
+
     def check_data(self):
         if self.data is None:
             messagebox.showerror("Error", "Please load an audio file first!")
             return False
         return True
 
-    def get_bit_depth(self, file_path, ext):
-        try:
-            if ext == "wav":
-                with wave.open(file_path, 'rb') as wav_file:
-                    return f"{wav_file.getsampwidth() * 8}-bit"
-            else:
-                info = sf.info(file_path)
-                if "PCM" in info.subtype:
-                    return f"{info.subtype.replace('PCM_', '')}-bit"
-                else:
-                    return "n/a"
-        except Exception:
-            return "n/a"
-
     def analyze_audio(self, file_path):
+        """
+        Starts decoding in a separate process (see decoder_worker.py). The header
+        and partial statistics appear while decoding continues; a previous decode
+        is killed right away.
+        """
         self.on_stop()
-        try:
-            file_name = os.path.basename(file_path)
-            ext = os.path.splitext(file_path)[1].lower().replace('.', '')
-            file_format = ext.upper()
-            bit_depth = self.get_bit_depth(file_path, ext)
+        self.stop_live()
+        self._release_decode()
+        for button in self.buttons.values():
+            button.config(state="disabled")
+
+        self.decode_file_path = file_path
+        self.decode_job = decoder_worker.DecodeJob(file_path)
+        self.file_label.config(text="Decoding...")
+        self.info_label.config(text=f"📂 {os.path.basename(file_path)}\n⏳ Starting decoder...")
+        self.decode_poll_handle = self.root.after(DECODE_POLL_MS, self._poll_decode)
+
+    def _release_decode(self):
+        """Stops the current decode (if any) and frees the samples of the previous file."""
+        if self.decode_poll_handle is not None:
+            self.root.after_cancel(self.decode_poll_handle)
+            self.decode_poll_handle = None
+        # Сначала отпускаем все массивы поверх shared memory, потом сам блок
+        self.data = None
+        self.graph = None
+        self.activity = None
+        if self.decode_job is not None:
+            self.decode_job.cancel()
+            self.decode_job = None
+
+    def _poll_decode(self):
+        self.decode_poll_handle = None
+        job = self.decode_job
+        if job is None:
+            return
+        for message in job.poll():
+            kind = message[0]
+            if kind == "header":
+                self._show_file_info(message[1], 0, None)
+            elif kind == "progress":
+                self._show_file_info(job.header, message[1], message[2])
+            elif kind == "done":
+                self._on_decode_done(job, message[1], message[2])
+                return
+            elif kind == "error":
+                self._release_decode()
+                self.file_label.config(text="No file loaded")
+                self.info_label.config(text="")
+                messagebox.showerror("Error", f"Failed to process the file!\n{message[1]}")
+                return
+        self.decode_poll_handle = self.root.after(DECODE_POLL_MS, self._poll_decode)
 
-            if ext in ["wav", "flac", "ogg", "aiff", "aif"]:
-                try:
-                    sample_rate, data = wavfile.read(file_path)
-                    data = data.astype(np.float32)
-                    max_abs = np.max(np.abs(data))
-                    if max_abs > 0:
-                        data /= max_abs
-                except Exception:
-                    data, sample_rate = sf.read(file_path, always_2d=True)
-                if data.ndim > 1:
-                    channels = data.shape[1]
-                    if channels == 1:
-                        data = data[:, 0]
-                else:
-                    channels = 1
-            else:
-                # Для mp3, m4a и т.д.
-                audio = AudioSegment.from_file(file_path)
-                sample_rate = audio.frame_rate
-                channels = audio.channels
-                data = np.array(audio.get_array_of_samples())
-                if channels > 1:
-                    data = data.reshape((-1, channels))
-                max_val = float(2 ** (8 * audio.sample_width))
-                data = data.astype(np.float32) / max_val
+    def _on_decode_done(self, job, frames, results):
+        try:
+            data = job.array(frames)
+            sample_rate = job.header["sample_rate"]
 
             self.data = data
             self.sample_rate = sample_rate
+            self.graph = pipeline.AnalysisGraph(data, sample_rate)
+            # Статистику и индекс активности уже посчитал процесс декодера
+            stats = results["statistics"]
+            self.activity = results["activity"]
+            self.graph.seed("statistics", stats)
+            self.graph.seed("activity", self.activity)
+            self.channel_subset = None
+            self.channel_offset = 0
+
+            self._show_file_info(job.header, frames, stats)
+            self.file_label.config(text="File loaded!")
+            for button in self.buttons.values():
+                button.config(state="normal")
 
-            # === Изменение: дополнительно храним audio_segment для воспроизведения
-            self.audio_segment = AudioSegment.from_file(file_path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to process the file!\n{str(e)}")
 
-            # Статистика
+    def _show_file_info(self, header, frames_done, stats):
+        """
+        Fills the info panel. While decoding, `frames_done` < header["frames"] and
+        `stats` are the partial statistics of the samples decoded so far.
+        """
+        file_name = os.path.basename(self.decode_file_path)
+        file_format = audio_io.get_file_format(self.decode_file_path).upper()
+        sample_rate = header["sample_rate"]
+        channels = header["channels"]
+        total_frames = header["frames"]
+        decoding = self.data is None
+
+        if stats is None:
+            stats_str = ""
+        else:
+            min_val, max_val = stats["min"], stats["max"]
+            mean_val, rms_val = stats["mean"], stats["rms"]
             if channels == 1:
-                min_val = np.min(data)
-                max_val = np.max(data)
-                mean_val = np.mean(data)
-                rms_val = np.sqrt(np.mean(data ** 2))
-                channel_info = "Mono"
                 stats_str = (
-                    f"🔎Min: {min_val:.4f}\n"
-                    f"🔎Max: {max_val:.4f}\n"
-                    f"📉Mean: {mean_val:.4f}, RMS: {rms_val:.4f}"
+                    f"🔎Min: {min_val[0]:.4f}\n"
+                    f"🔎Max: {max_val[0]:.4f}\n"
+                    f"📉Mean: {mean_val[0]:.4f}, RMS: {rms_val[0]:.4f}"
                 )
             else:
-                channel_info = "Stereo" if channels == 2 else f"{channels} channels"
-                min_val = np.min(data, axis=0)
-                max_val = np.max(data, axis=0)
-                mean_val = np.mean(data, axis=0)
-                rms_val = np.sqrt(np.mean(data ** 2, axis=0))
                 stats_list = []
-                for i in range(channels):
+                for i in range(min(channels, plots.MAX_VISIBLE_CHANNELS)):
                     stats_list.append(
                         f"Channel {i + 1}:\n"
                         f"  🔎Min: {min_val[i]:.4f}, Max: {max_val[i]:.4f}\n"
                         f"  📉Mean: {mean_val[i]:.4f}, RMS: {rms_val[i]:.4f}"
                     )
+                if channels > plots.MAX_VISIBLE_CHANNELS:
+                    stats_list.append(f"... and {channels - plots.MAX_VISIBLE_CHANNELS} more channels")
                 stats_str = "\n".join(stats_list)
 
-            self.file_label.config(text="File loaded!")
-            self.info_label.config(
-                text=(
-                    f"📂 {file_name}\n"
-                    f"📄 Format: {file_format}\n"
-                    f"🎵Sample rate: {sample_rate} Hz\n"
-                    f"📝Bit depth: {bit_depth}\n"
-                    f"⌛Duration: {len(data) / sample_rate:.2f} sec\n"
-                    f"🔊Channels: {channel_info}\n"
-                    f"{stats_str}"
-                )
-            )
-            for button in self.buttons.values():
-                button.config(state="normal")
+        if channels == 1:
+            channel_info = "Mono"
+        else:
+            channel_info = "Stereo" if channels == 2 else f"{channels} channels"
 
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to process the file!\n{str(e)}")
+        if decoding:
+            percent = 100.0 * frames_done / total_frames if total_frames else 0.0
+            status_str = f"⏳Decoding: {percent:.0f}% (partial statistics)\n"
+        else:
+            status_str = f"🔈Active: {self.activity.active_ratio * 100:.1f}% ({len(self.activity.events)} events)\n"
+
+        self.info_label.config(
+            text=(
+                f"📂 {file_name}\n"
+                f"📄 Format: {file_format}\n"
+                f"🎵Sample rate: {sample_rate} Hz\n"
+                f"📝Bit depth: {header['bit_depth']}\n"
+                f"⌛Duration: {total_frames / sample_rate:.2f} sec\n"
+                f"🔊Channels: {channel_info}\n"
+                f"{status_str}"
+                f"{stats_str}"
+            )
+        )
 
     # ----------------- Методы построения графиков (Waveform, Spectrogram, ...) -----------------
     def show_waveform(self):
@@ -731,44 +1070,10 @@ class SoundAnalyzer:
         self.root.after(1500, self._plot_waveform)
 
     def _plot_waveform(self):
-        # Если placeholder_label отображается, скрываем его и создаем Figure, Canvas, Toolbar
-        if self.placeholder_label is not None and self.placeholder_label.winfo_ismapped():
-            self.placeholder_label.pack_forget()
-            self.placeholder_label = None
-
-            self.figure = Figure(figsize=(6, 4), dpi=100)
-            self.canvas = FigureCanvasTkAgg(self.figure, master=self.right_frame)
-            self.canvas_widget = self.canvas.get_tk_widget()
-            self.canvas_widget.pack(fill="both", expand=True)
-
-            self.toolbar = NavigationToolbar2Tk(self.canvas, self.right_frame)
-            self.toolbar.update()
-            self.toolbar.pack(side="bottom", fill="x")
-
-        self.figure.clear()
-        if self.data.ndim == 1:
-            ax = self.figure.add_subplot(111)
-            time = np.linspace(0, len(self.data) / self.sample_rate, num=len(self.data))
-            ax.plot(time, self.data, color='blue')
-            ax.set_title("Waveform (Mono)")
-            ax.set_xlabel("Time (sec)")
-            ax.set_ylabel("Amplitude")
-            ax.grid()
-        else:
-            n_channels = self.data.shape[1]
-            if n_channels == 2:
-                colors = ['blue', 'red']
-            else:
-                colors = ['blue', 'red', 'green', 'orange', 'purple', 'brown']
-            for i in range(n_channels):
-                ax = self.figure.add_subplot(n_channels, 1, i + 1)
-                channel_data = self.data[:, i]
-                time = np.linspace(0, len(channel_data) / self.sample_rate, num=len(channel_data))
-                ax.plot(time, channel_data, color=colors[i % len(colors)])
-                ax.set_title(f"Waveform (Channel {i + 1})")
-                ax.set_ylabel("Amplitude")
-                ax.grid()
-                ax.set_xlabel("Time (sec)")
+        self._ensure_figure()
+        self.current_plot = self._plot_waveform
+        self.render_view("waveform")
+        self._update_channel_scrollbar()
         self.canvas.draw()
         self.hide_loading_dialog()
 
@@ -779,36 +1084,10 @@ class SoundAnalyzer:
             self.root.after(1500, self._plot_spectrogram)
 
     def _plot_spectrogram(self):
-        # Если placeholder_label отображается, скрываем его и создаем Figure, Canvas, Toolbar
-        if self.placeholder_label is not None and self.placeholder_label.winfo_ismapped():
-            self.placeholder_label.pack_forget()
-            self.placeholder_label = None
-
-            self.figure = Figure(figsize=(6, 4), dpi=100)
-            self.canvas = FigureCanvasTkAgg(self.figure, master=self.right_frame)
-            self.canvas_widget = self.canvas.get_tk_widget()
-            self.canvas_widget.pack(fill="both", expand=True)
-
-            self.toolbar = NavigationToolbar2Tk(self.canvas, self.right_frame)
-            self.toolbar.update()
-            self.toolbar.pack(side="bottom", fill="x")
-
-        self.figure.clear()
-        if self.data.ndim == 1:
-            ax = self.figure.add_subplot(111)
-            ax.specgram(self.data, Fs=self.sample_rate, cmap='inferno', NFFT=2048, noverlap=1024)
-            ax.set_title("Spectrogram (Mono)")
-            ax.set_xlabel("Time (sec)")
-            ax.set_ylabel("Frequency (Hz)")
-        else:
-            n_channels = self.data.shape[1]
-            for i in range(n_channels):
-                ax = self.figure.add_subplot(n_channels, 1, i + 1)
-                channel_data = self.data[:, i]
-                ax.specgram(channel_data, Fs=self.sample_rate, cmap='inferno', NFFT=2048, noverlap=1024)
-                ax.set_title(f"Spectrogram (Channel {i + 1})")
-                ax.set_ylabel("Frequency (Hz)")
-            ax.set_xlabel("Time (sec)")
+        self._ensure_figure()
+        self.current_plot = self._plot_spectrogram
+        self.render_view("spectrogram")
+        self._update_channel_scrollbar()
         self.canvas.draw()
         self.hide_loading_dialog()
 
@@ -819,45 +1098,10 @@ class SoundAnalyzer:
         self.root.after(1500, self._plot_dft)
 
     def _plot_dft(self):
-        # Если placeholder_label отображается, скрываем его и создаем Figure, Canvas, Toolbar
-        if self.placeholder_label is not None and self.placeholder_label.winfo_ismapped():
-            self.placeholder_label.pack_forget()
-            self.placeholder_label = None
-
-            self.figure = Figure(figsize=(6, 4), dpi=100)
-            self.canvas = FigureCanvasTkAgg(self.figure, master=self.right_frame)
-            self.canvas_widget = self.canvas.get_tk_widget()
-            self.canvas_widget.pack(fill="both", expand=True)
-
-            self.toolbar = NavigationToolbar2Tk(self.canvas, self.right_frame)
-            self.toolbar.update()
-            self.toolbar.pack(side="bottom", fill="x")
-
-        self.figure.clear()
-        if self.data.ndim == 1:
-            ax = self.figure.add_subplot(111)
-            d = self.data
-            spectrum = np.fft.fft(d)
-            freqs = np.fft.fftfreq(len(d), d=1 / self.sample_rate)
-            half = len(freqs) // 2
-            ax.plot(freqs[:half], np.abs(spectrum[:half]), color='purple')
-            ax.set_title("DFT Spectrum (Mono)")
-            ax.set_xlabel("Frequency (Hz)")
-            ax.set_ylabel("Amplitude")
-            ax.grid()
-        else:
-            n_channels = self.data.shape[1]
-            for i in range(n_channels):
-                ax = self.figure.add_subplot(n_channels, 1, i + 1)
-                d = self.data[:, i]
-                spectrum = np.fft.fft(d)
-                freqs = np.fft.fftfreq(len(d), d=1 / self.sample_rate)
-                half = len(freqs) // 2
-                ax.plot(freqs[:half], np.abs(spectrum[:half]), color='purple')
-                ax.set_title(f"DFT Spectrum (Channel {i + 1})")
-                ax.set_ylabel("Amplitude")
-                ax.grid()
-            ax.set_xlabel("Frequency (Hz)")
+        self._ensure_figure()
+        self.current_plot = self._plot_dft
+        self.render_view("dft")
+        self._update_channel_scrollbar()
         self.canvas.draw()
         self.hide_loading_dialog()
 
@@ -868,46 +1112,114 @@ class SoundAnalyzer:
         self.root.after(1500, self._plot_3d_spectrogram)
 
     def _plot_3d_spectrogram(self):
-        from mpl_toolkits.mplot3d import Axes3D  # noqa
-        # Если placeholder_label отображается, скрываем его и создаем Figure, Canvas, Toolbar
-        if self.placeholder_label is not None and self.placeholder_label.winfo_ismapped():
-            self.placeholder_label.pack_forget()
-            self.placeholder_label = None
+        self._ensure_figure()
+        self.current_plot = self._plot_3d_spectrogram
+        self.render_view("3d")
+        self._update_channel_scrollbar()
+        self.canvas.draw()
+        self.hide_loading_dialog()
 
-            self.figure = Figure(figsize=(6, 4), dpi=100)
-            self.canvas = FigureCanvasTkAgg(self.figure, master=self.right_frame)
-            self.canvas_widget = self.canvas.get_tk_widget()
-            self.canvas_widget.pack(fill="both", expand=True)
+    def show_mel_spectrogram(self):
+        if not self.check_data():
+            return
+        self.show_loading_dialog()
+        self.root.after(1500, self._plot_mel_spectrogram)
 
-            self.toolbar = NavigationToolbar2Tk(self.canvas, self.right_frame)
-            self.toolbar.update()
-            self.toolbar.pack(side="bottom", fill="x")
+    def _plot_mel_spectrogram(self):
+        self._ensure_figure()
+        self.current_plot = self._plot_mel_spectrogram
+        self.render_view("mel")
+        self._update_channel_scrollbar()
+        self.canvas.draw()
+        self.hide_loading_dialog()
 
-        self.figure.clear()
-        if self.data.ndim == 1:
-            ax = self.figure.add_subplot(111, projection='3d')
-            nperseg = min(2048, len(self.data) // 10)
-            f, t, Sxx = spectrogram(self.data, self.sample_rate, nperseg=nperseg)
-            T, F = np.meshgrid(t, f)
-            ax.plot_surface(T, F, 10 * np.log10(Sxx + 1e-10), cmap="jet")
-            ax.set_title("3D Spectrogram (Mono)")
-            ax.set_xlabel("Time (sec)")
-            ax.set_ylabel("Frequency (Hz)")
-            ax.set_zlabel("Magnitude (dB)")
-        else:
-            n_channels = self.data.shape[1]
-            nperseg = min(2048, self.data.shape[0] // 10)
-            for i in range(n_channels):
-                ax = self.figure.add_subplot(1, n_channels, i + 1, projection='3d')
-                f, t, Sxx = spectrogram(self.data[:, i], self.sample_rate, nperseg=nperseg)
-                T, F = np.meshgrid(t, f)
-                ax.plot_surface(T, F, 10 * np.log10(Sxx + 1e-10), cmap="jet")
-                ax.set_title(f"3D Spectrogram (Channel {i + 1})")
-                ax.set_ylabel("Frequency (Hz)")
-                ax.set_zlabel("Magnitude (dB)")
-            ax.set_xlabel("Time (sec)")
+    def show_cqt_spectrogram(self):
+        if not self.check_data():
+            return
+        self.show_loading_dialog()
+        self.root.after(1500, self._plot_cqt_spectrogram)
+
+    def _plot_cqt_spectrogram(self):
+        self._ensure_figure()
+        self.current_plot = self._plot_cqt_spectrogram
+        self.render_view("cqt")
+        self._update_channel_scrollbar()
+        self.canvas.draw()
+        self.hide_loading_dialog()
+
+    def show_dft_benchmark(self):
+        # Бенчмарк не требует загруженного файла — сигналы генерируются случайно
+        self.show_loading_dialog()
+        self.root.after(100, self._plot_dft_benchmark)
+
+    def _plot_dft_benchmark(self):
+        self._ensure_figure()
+        results = educational_dft.benchmark()
+        self.current_plot = None
+        plots.plot_dft_benchmark(self.figure, results)
+        self.channel_scrollbar.pack_forget()
+        self.canvas.draw()
+        self.hide_loading_dialog()
+
+    def find_duplicates(self):
+        """Looks up the loaded file in a fingerprint index built with fingerprint.py."""
+        if not self.check_data():
+            return
+        index_dir = filedialog.askdirectory(title="Select Fingerprint Index",
+                                            initialdir=self.fingerprint_index_dir)
+        if not index_dir:
+            return
+        if not os.path.exists(os.path.join(index_dir, fingerprint.CATALOG)):
+            messagebox.showerror("Error", "This folder is not a fingerprint index!\n"
+                                          "Create one with: python fingerprint.py index <folder> <files>")
+            return
+        self.fingerprint_index_dir = index_dir
+        self.show_loading_dialog()
+        self.root.after(100, lambda: self._find_duplicates(index_dir))
+
+    def _find_duplicates(self, index_dir):
+        try:
+            # Отпечаток строим по уже декодированному сигналу — файл заново не читаем
+            hashes, anchors = fingerprint.fingerprint(self.data, self.sample_rate)
+            matches = fingerprint.FingerprintIndex(index_dir).query(hashes, anchors)
+        except Exception as e:
+            self.hide_loading_dialog()
+            messagebox.showerror("Error", f"Fingerprint search failed!\n{str(e)}")
+            return
+        self.hide_loading_dialog()
+        own_path = os.path.abspath(self.decode_file_path)
+        lines = [f"{m['matches']} matches, offset {m['offset_sec']:.2f} sec — {m['path']}"
+                 for m in matches if m["path"] != own_path]
+        messagebox.showinfo("Find Duplicates", "\n".join(lines) if lines else "No duplicates found.")
+
+    def align_with_file(self):
+        """Finds the time offset of another recording of the same event and shows both aligned."""
+        if not self.check_data():
+            return
+        other_path = filedialog.askopenfilename(
+            title="Select Recording to Align",
+            filetypes=[("Audio Files", " ".join(f"*.{ext}" for ext in audio_io.SUPPORTED_FORMATS))])
+        if not other_path:
+            return
+        self.show_loading_dialog()
+        self.root.after(100, lambda: self._align_with_file(other_path))
+
+    def _align_with_file(self, other_path):
+        try:
+            # Оба файла читаются потоково с диска — загруженный сигнал в памяти не копируется
+            result = alignment.align(self.decode_file_path, other_path, with_envelopes=True)
+        except Exception as e:
+            self.hide_loading_dialog()
+            messagebox.showerror("Error", f"Alignment failed!\n{str(e)}")
+            return
+        self._ensure_figure()
+        self.current_plot = None
+        plots.plot_alignment(self.figure, result, [os.path.basename(self.decode_file_path),
+                                                   os.path.basename(other_path)])
+        self.channel_scrollbar.pack_forget()
         self.canvas.draw()
         self.hide_loading_dialog()
+        messagebox.showinfo("Align With File", alignment.format_result(result))
 
 
 # ---------------------- Splash Screen ----------------------
@@ -937,6 +1249,8 @@ def show_splash(root, duration=4000):
 
 # ---------------------- Основной блок ----------------------
 if __name__ == "__main__":
+    # Нужно для процесса декодирования в собранном PyInstaller-приложении
+    multiprocessing.freeze_support()
     root = tk.Tk()
     root.withdraw()  # Скрываем главное окно
     show_splash(root, duration=2000)  # Splash screen на 2 секунды